@@ -0,0 +1,448 @@
+# knowledge_graph_analysis.py
+from array import array
+
+from knowledge_graph_index import compile_kg, POSITIVE, NEGATIVE, AMBIGUOUS, SIGN_STRINGS
+
+
+class Condensation:
+    """
+    Strongly connected components of a compiled graph and the DAG between them.
+
+    component[i] is the component of node index i. Components are numbered in
+    topological order, so every condensation edge goes from a lower to a higher
+    component id. members[c] lists the node indices of component c, and its DAG
+    successors are dag_targets[dag_offsets[c]:dag_offsets[c+1]]. cyclic[c] is 1
+    for components that contain a feedback loop (more than one node, or a self-loop).
+    Path search prunes with ReachabilityIndex; the condensation only reports
+    which components (and feedback loops) a path runs through.
+    """
+
+    def __init__(self, g, component, members):
+        self.g = g
+        self.component = component
+        self.members = members
+        self.cyclic = bytearray(len(members))
+        successors = [set() for _ in members]
+        for i in range(len(g)):
+            c = component[i]
+            for target, _ in g.out_edges_of(i):
+                d = component[target]
+                if d != c:
+                    successors[c].add(d)
+                elif target == i or len(members[c]) > 1:
+                    self.cyclic[c] = 1
+        self.dag_offsets = array("l", [0])
+        self.dag_targets = array("l")
+        for c in range(len(members)):
+            self.dag_targets.extend(sorted(successors[c]))
+            self.dag_offsets.append(len(self.dag_targets))
+
+    def __len__(self):
+        return len(self.members)
+
+    def path_components(self, path):
+        """Components a path of node ids passes through, in order, consecutive repeats merged."""
+        passed = []
+        for node_id in path:
+            c = self.component[self.g.index[node_id]]
+            if not passed or passed[-1] != c:
+                passed.append(c)
+        return passed
+
+    def member_ids(self, c):
+        return [self.g.ids[i] for i in self.members[c]]
+
+
+def condensation(kg):
+    """
+    Compute the SCC condensation of kg once (iterative Tarjan over the out-edge
+    CSR arrays) and memoize it on the compiled graph.
+    Returns: Condensation.
+    """
+    g = compile_kg(kg)
+    if "condensation" in g.derived:
+        return g.derived["condensation"]
+    found = _strong_components(len(g), g.out_offsets, g.out_targets)
+    component = array("l", [0] * len(g))
+    for c, members in enumerate(found):
+        for i in members:
+            component[i] = c
+    result = Condensation(g, component, found)
+    g.derived["condensation"] = result
+    return result
+
+
+def _strong_components(n, offsets, targets):
+    """
+    Iterative Tarjan over a CSR graph of n vertices. Returns the components as
+    sorted vertex lists in topological order (every edge between two components
+    goes from an earlier one to a later one).
+    """
+    unvisited = -1
+    order = array("l", [unvisited] * n)
+    low = array("l", [0] * n)
+    on_stack = bytearray(n)
+    stack = []
+    found = []
+    counter = 0
+    for root in range(n):
+        if order[root] != unvisited:
+            continue
+        order[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = 1
+        # Frames of (node, next out-edge slot)
+        frames = [[root, offsets[root]]]
+        while frames:
+            frame = frames[-1]
+            node, slot = frame
+            if slot < offsets[node + 1]:
+                frame[1] += 1
+                target = targets[slot]
+                if order[target] == unvisited:
+                    order[target] = low[target] = counter
+                    counter += 1
+                    stack.append(target)
+                    on_stack[target] = 1
+                    frames.append([target, offsets[target]])
+                elif on_stack[target] and order[target] < low[node]:
+                    low[node] = order[target]
+                continue
+            frames.pop()
+            if frames and low[node] < low[frames[-1][0]]:
+                low[frames[-1][0]] = low[node]
+            if low[node] == order[node]:
+                members = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = 0
+                    members.append(member)
+                    if member == node:
+                        break
+                found.append(sorted(members))
+    # Tarjan emits sinks first; reverse to number components topologically
+    found.reverse()
+    return found
+
+
+class ReachabilityIndex:
+    """
+    Transitive closure of a compiled graph as bitsets, for constant-time
+    "can X affect Y" checks and for pruning traversals.
+
+    With signed=True the closure is taken over (node, sign) states: state
+    2 * i is node i moved up, 2 * i + 1 node i moved down, a "+" edge keeps the
+    sign, a "-" edge flips it and a "+/-" edge leads to both. A shock on a
+    source starts in its "up" state, like the first edge of make_scenario.
+    With signed=False the states are just the nodes.
+
+    Reachability is over walks (cycles and the source itself may be revisited),
+    so "no" is definitive while "yes" means at least one walk exists; for
+    simple paths it is a safe over-approximation. Bitsets are Python ints kept
+    per strongly connected component of the state graph, filled in one pass in
+    reverse topological order, so a rebuild costs O(E * C / 64) machine words.
+    """
+
+    def __init__(self, kg, signed=True):
+        g = compile_kg(kg)
+        self.g = g
+        self.signed = signed
+        if signed:
+            offsets, targets = _signed_state_graph(g)
+        else:
+            offsets, targets = g.out_offsets, g.out_targets
+        n = len(offsets) - 1
+        found = _strong_components(n, offsets, targets)
+        self.component = array("l", [0] * n)
+        for c, members in enumerate(found):
+            for state in members:
+                self.component[state] = c
+        members_mask = [sum(1 << state for state in members) for members in found]
+        self.reach = [0] * len(found)
+        for c in range(len(found) - 1, -1, -1):
+            bits = 0
+            cyclic = len(found[c]) > 1
+            for state in found[c]:
+                for slot in range(offsets[state], offsets[state + 1]):
+                    d = self.component[targets[slot]]
+                    if d == c:
+                        cyclic = True
+                    else:
+                        bits |= members_mask[d] | self.reach[d]
+            self.reach[c] = bits | (members_mask[c] if cyclic else 0)
+        self._bounds = {}
+
+    def _state(self, node_id, sign="+"):
+        i = self.g.index[node_id]
+        return 2 * i + (sign == "-") if self.signed else i
+
+    def can_affect(self, source_id, target_id, sign=None):
+        """
+        Whether a shock on source_id can reach target_id, arriving with net
+        sign ("+"/"-") when given (signed indexes only).
+        """
+        if source_id not in self.g.index or target_id not in self.g.index:
+            return False
+        bits = self.reach[self.component[self._state(source_id)]]
+        if not self.signed:
+            if sign is not None:
+                raise ValueError("This reachability index was built with signed=False.")
+            return bool(bits >> self.g.index[target_id] & 1)
+        t = 2 * self.g.index[target_id]
+        if sign is None:
+            return bool(bits >> t & 3)
+        return bool(bits >> (t + (sign == "-")) & 1)
+
+    def reachable_bits(self, i):
+        """Bitset of the states reachable from state i (node index i when signed=False)."""
+        return self.reach[self.component[i]]
+
+    def affected(self, source_id):
+        """Node ids a shock on source_id can reach, with the net signs it can arrive with."""
+        bits = self.reach[self.component[self._state(source_id)]]
+        found = {}
+        for i, node_id in enumerate(self.g.ids):
+            if self.signed:
+                signs = [sign for b, sign in ((0, "+"), (1, "-")) if bits >> (2 * i + b) & 1]
+            else:
+                signs = ["+", "-"] if bits >> i & 1 else []
+            if signs:
+                found[node_id] = signs
+        return found
+
+    def bound(self, target_ids, wanted=None):
+        """
+        A per-(node, sign) pruning table in the format of remaining_hops, for
+        iter_signed_paths: 0 for states that are (or can reach) a target index in
+        target_ids arriving with net sign wanted ("+"/"-"/None for either),
+        len(g) + 1 for the rest. Memoized per (targets, wanted).
+        """
+        key = (frozenset(target_ids), wanted)
+        if key not in self._bounds:
+            mask = 0
+            for t in target_ids:
+                for b, sign in ((0, "+"), (1, "-")):
+                    if wanted is None or sign == wanted:
+                        mask |= 1 << (2 * t + b if self.signed else t)
+            n = len(self.g)
+            unreachable = n + 1
+            hops = array("l", [unreachable] * (2 * n))
+            live = [bool(bits & mask) for bits in self.reach]
+            for i in range(n):
+                for b in (0, 1):
+                    state = 2 * i + b if self.signed else i
+                    if live[self.component[state]] or mask >> state & 1:
+                        hops[2 * i + b] = 0
+            self._bounds[key] = hops
+        return self._bounds[key]
+
+
+def _signed_state_graph(g):
+    """CSR arrays of the (node, sign) state graph used by ReachabilityIndex."""
+    offsets = array("l", [0])
+    targets = array("l")
+    for state in range(2 * len(g)):
+        node, down = divmod(state, 2)
+        for target, edge_sign in g.out_edges_of(node):
+            if edge_sign == AMBIGUOUS:
+                targets.append(2 * target)
+                targets.append(2 * target + 1)
+            else:
+                flips = (edge_sign == NEGATIVE) != bool(down)
+                targets.append(2 * target + flips)
+        offsets.append(len(targets))
+    return offsets, targets
+
+
+def reachability(kg, signed=True):
+    """ReachabilityIndex for kg, built once per compiled graph and kind."""
+    g = compile_kg(kg)
+    key = ("reachability", signed)
+    if key not in g.derived:
+        g.derived[key] = ReachabilityIndex(g, signed)
+    return g.derived[key]
+
+
+def remaining_hops(kg, target_ids, wanted=None):
+    """
+    Fewest hops from every (node, sign) state to a node index in target_ids,
+    arriving with net sign wanted ("+"/"-"/None for either), by one reverse BFS
+    over the state graph. Indexed by 2 * node + (0 for "+", 1 for "-"); targets
+    reached with the wrong sign and unreachable states get len(g) + 1.
+    Node repeats are allowed, so it is a lower bound for simple paths.
+    """
+    g = compile_kg(kg)
+    unreachable = len(g) + 1
+    hops = array("l", [unreachable] * (2 * len(g)))
+    frontier = []
+    for t in target_ids:
+        for sign in (POSITIVE, NEGATIVE):
+            if wanted is None or SIGN_STRINGS[sign] == wanted:
+                hops[2 * t + (sign == NEGATIVE)] = 0
+                frontier.append((t, sign))
+    depth = 0
+    while frontier:
+        depth += 1
+        nxt = []
+        for node, sign in frontier:
+            for k in range(g.in_offsets[node], g.in_offsets[node + 1]):
+                source = g.in_sources[k]
+                if source in target_ids:
+                    continue
+                edge_sign = g.in_signs[k]
+                for prev in ((POSITIVE, NEGATIVE) if edge_sign == AMBIGUOUS else (sign * edge_sign,)):
+                    if hops[2 * source + (prev == NEGATIVE)] == unreachable:
+                        hops[2 * source + (prev == NEGATIVE)] = depth
+                        nxt.append((source, prev))
+        frontier = nxt
+    return hops
+
+
+def iter_cycles(kg, max_length=None):
+    """
+    Yield every elementary cycle of kg once, as a list of node indices starting
+    at the cycle's lowest index (the closing edge back to it is implied).
+
+    Johnson's algorithm: cycles are rooted at their lowest node s and searched
+    only inside s's strongly connected component, restricted to nodes >= s.
+    Without max_length, the search uses Johnson's blocked sets, so the work per
+    cycle is linear in the size of the graph. With max_length (in edges), the
+    blocking rule no longer holds, so it is replaced by a reverse BFS of the hop
+    distance back to s: a node is only entered if the cycle can still close
+    within max_length edges.
+    """
+    g = compile_kg(kg)
+    scc = condensation(g)
+    n = len(g)
+    for s in range(n):
+        c = scc.component[s]
+        if not scc.cyclic[c]:
+            continue
+
+        def successors(node):
+            # Parallel edges lead to the same cycle, so each neighbour is listed once
+            return list(dict.fromkeys(t for t, _ in g.out_edges_of(node) if t >= s and scc.component[t] == c))
+
+        if max_length is None:
+            yield from _johnson_circuits(s, successors)
+        else:
+            yield from _bounded_circuits(g, s, c, scc, successors, max_length)
+
+
+def _johnson_circuits(s, successors):
+    blocked = {s}
+    blocked_by = {}
+    closed = set()
+    path = [s]
+    stack = [(s, successors(s))]
+
+    def unblock(node):
+        pending = [node]
+        while pending:
+            node = pending.pop()
+            if node in blocked:
+                blocked.discard(node)
+                pending.extend(blocked_by.pop(node, ()))
+
+    while stack:
+        node, moves = stack[-1]
+        if moves:
+            nxt = moves.pop()
+            if nxt == s:
+                yield list(path)
+                closed.update(path)
+            elif nxt not in blocked:
+                path.append(nxt)
+                stack.append((nxt, successors(nxt)))
+                closed.discard(nxt)
+                blocked.add(nxt)
+                continue
+        if not moves:
+            if node in closed:
+                unblock(node)
+            else:
+                for nxt in successors(node):
+                    blocked_by.setdefault(nxt, set()).add(node)
+            stack.pop()
+            path.pop()
+
+
+def _bounded_circuits(g, s, c, scc, successors, max_length):
+    # Hops from each node back to s inside the search subgraph
+    back = {s: 0}
+    frontier = [s]
+    while frontier and back[frontier[0]] < max_length:
+        nxt = []
+        for node in frontier:
+            for source, _ in g.in_edges_of(node):
+                if source >= s and scc.component[source] == c and source not in back:
+                    back[source] = back[node] + 1
+                    nxt.append(source)
+        frontier = nxt
+    on_path = {s}
+    path = [s]
+    stack = [successors(s)]
+    while stack:
+        moves = stack[-1]
+        if not moves:
+            stack.pop()
+            on_path.discard(path.pop())
+            continue
+        nxt = moves.pop()
+        if nxt == s:
+            yield list(path)
+        elif nxt not in on_path and nxt in back and len(path) + back[nxt] <= max_length:
+            path.append(nxt)
+            on_path.add(nxt)
+            stack.append(successors(nxt))
+
+
+def loop_polarity(signs):
+    """
+    "reinforcing" when the product of the loop's edge signs is +, "balancing"
+    when it is -, and "ambiguous" when any edge is "+/-".
+    """
+    if "+/-" in signs:
+        return "ambiguous"
+    return "balancing" if signs.count("-") % 2 else "reinforcing"
+
+
+def feedback_loops(kg, max_length=6, limit=None, cache=None):
+    """
+    The feedback loops of kg with at most max_length edges, shortest first (ties
+    in discovery order), each as a {"nodes", "labels", "signs", "polarity",
+    "length"} dict. signs[i] is the sign of the edge out of nodes[i] (the last
+    one closes the loop); a loop's polarity comes from loop_polarity.
+    Results are memoized on the compiled graph and, when a QueryCache is given,
+    cached by graph fingerprint as well. limit caps how many loops are returned.
+    """
+    g = compile_kg(kg)
+    memo_key = ("feedback_loops", max_length)
+    loops = g.derived.get(memo_key)
+    if loops is None and cache is not None:
+        key = cache.key(g, "feedback_loops", max_length=max_length)
+        loops = cache.get(key)
+    if loops is None:
+        loops = []
+        for cycle in iter_cycles(g, max_length):
+            ids = [g.ids[i] for i in cycle]
+            signs = [g.edge_sign(a, b) for a, b in zip(ids, ids[1:] + ids[:1])]
+            loops.append({
+                "nodes": ids,
+                "labels": [g.labels[i] for i in cycle],
+                "signs": signs,
+                "polarity": loop_polarity(signs),
+                "length": len(cycle),
+            })
+        loops.sort(key=lambda loop: loop["length"])
+        if cache is not None:
+            cache.put(key, loops)
+    g.derived[memo_key] = loops
+    return loops if limit is None else loops[:limit]
+
+
+def format_loop(loop):
+    """Render a feedback loop as "A (+) → B (-) → A [balancing]"."""
+    steps = [f"{label} ({sign})" for label, sign in zip(loop["labels"], loop["signs"])]
+    return " → ".join(steps + [loop["labels"][0]]) + f" [{loop['polarity']}]"
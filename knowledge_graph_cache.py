@@ -0,0 +1,94 @@
+# knowledge_graph_cache.py
+import hashlib
+import json
+import os
+import pickle
+from collections import OrderedDict
+
+from knowledge_graph_index import CompiledKG
+
+
+def graph_fingerprint(kg):
+    """
+    SHA-256 of the graph content (nodes and edges, key order ignored).
+    Any edit to a node or edge changes the fingerprint, so results cached under
+    the old one are never served for the edited graph. A CompiledKG is a
+    snapshot, so its fingerprint is computed once and remembered.
+    """
+    if isinstance(kg, CompiledKG):
+        if kg.fingerprint is None:
+            kg.fingerprint = graph_fingerprint(kg.to_dict())
+        return kg.fingerprint
+    payload = json.dumps({"nodes": kg["nodes"], "edges": kg["edges"]}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class QueryCache:
+    """
+    LRU cache for KG path query results, keyed by graph fingerprint plus the
+    query name and parameters. Holds at most maxsize results in memory; when
+    cache_dir is given, every result is also pickled there, so later processes
+    (or entries already evicted from memory) can reuse it.
+    """
+
+    def __init__(self, maxsize=256, cache_dir=None):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, kg, name, **params):
+        """Content address of one query: fingerprint + name + sorted parameters."""
+        payload = json.dumps([graph_fingerprint(kg), name, params], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss."""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, key + ".pkl")
+            try:
+                with open(path, "rb") as f:
+                    value = pickle.load(f)
+            except (OSError, pickle.PickleError, EOFError):
+                value = None
+            if value is not None:
+                self._remember(key, value)
+                self.hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._remember(key, value)
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, key + ".pkl")
+            tmp = f"{path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp, "wb") as f:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, path)
+            except OSError as e:
+                print(f"Could not write cache entry {path}: {e}")
+
+    def _remember(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drop the in-memory tier (the on-disk tier is left alone)."""
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries or bool(self.cache_dir and os.path.exists(os.path.join(self.cache_dir, key + ".pkl")))
@@ -1,6 +1,7 @@
 # knowledge_graph_encoder.py
 from pprint import pprint
 from collections import deque
+from itertools import islice
 
 class MonetaryPolicy:
     def __init__(self, instruments, targets, channels):
@@ -15,6 +16,28 @@ class MonetaryPolicy:
             "channels": self.channels
         }
 
+    def attribute(self, kg, max_depth=8, decay=1.0, ambiguous=0.0):
+        """
+        Return {instrument: {target: {"total", "channels", "shares"}}}: how much of each
+        instrument's signed influence on each target flows through each channel
+        (see channel_attribution). Instrument and target names that are not node ids
+        are resolved with the graph's search index ('interest_rate' -> policy_rate),
+        and channel names map to first-hop nodes through policy_channels.
+        """
+        g = compile_kg(kg)
+        index = search_index(g)
+        resolve = lambda name: name if name in g.index else index.resolve(name)
+        targets = [node_id for node_id in map(resolve, self.targets) if node_id is not None]
+        channels = {name: policy_channels.get(name, [name]) for name in self.channels}
+        attribution = {}
+        for name in self.instruments:
+            instrument = resolve(name)
+            if instrument is None:
+                print(f"Instrument '{name}' does not match any node.")
+                continue
+            attribution[name] = channel_attribution(g, instrument, targets, channels, max_depth, decay, ambiguous)
+        return attribution
+
 class Scenario:
     def __init__(self, name, shocks):
         self.name = name
@@ -26,8 +49,36 @@ class Scenario:
             "shocks": self.shocks
         }
 
+    def propagate(self, kg, max_depth=8, decay=1.0, ambiguous=0.0):
+        """
+        Return {node_id: net impact} of this scenario's shocks on kg.
+        To score many scenarios at once, call propagate_scenarios with the whole list.
+        """
+        result = propagate_scenarios(kg, [self], max_depth, decay, ambiguous)
+        if result is None:
+            return None
+        return result.for_scenario(self.name)
+
+    def simulate(self, kg, horizon=8, max_depth=8, decay=1.0, ambiguous=0.0):
+        """
+        Return a SimulationResult with each node's impact over time, honouring
+        the optional "lag" on edges (see simulate_events).
+        """
+        return simulate_events(kg, self.shocks, horizon, max_depth, decay, ambiguous)
+
 # Import sample_kg from a separate file
-from knowledge_graph_sample import sample_kg
+from knowledge_graph_sample import sample_kg, policy_channels
+from knowledge_graph_index import compile_kg, POSITIVE, NEGATIVE, AMBIGUOUS
+from knowledge_graph_propagation import propagate_scenarios, channel_attribution
+from knowledge_graph_simulation import simulate_events
+from knowledge_graph_cache import QueryCache
+from knowledge_graph_parallel import iter_paths_parallel
+from knowledge_graph_search import search_index
+from knowledge_graph_analysis import reachability
+from knowledge_graph_paths import _as_set, PathResults, PathTrie, Deadline, count_paths, counts_exact, total_paths, iter_paths, iter_constrained_paths, format_path, feedback_components_of, write_paths, top_k_paths
+
+# Expanded targets to include more macroeconomic endpoints for richer transmission tracing
+TRANSMISSION_TARGETS = {"output", "prices", "SPX", "UST", "inflation", "inflation_expectations", "behavior_change", "supply_demand_imbalance", "global_costs", "production", "deflation"}
 
 # Step 2: Represent the KG for the LLM
 
@@ -45,50 +96,114 @@ def kg_to_text(kg):
         lines.append(f"- {src} {arrow} → {tgt}")
     return "\n".join(lines)
 
+# Arrow shown for each sign code in the textual KG
+SIGN_ARROWS = {POSITIVE: "↑", NEGATIVE: "↓", AMBIGUOUS: "↑/↓"}
+
+def approx_tokens(text):
+    """Rough LLM token count (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+def _text_fragments(g, i):
+    """kg_to_text lines for the out-edges of node index i, as (target index, line), cached per node."""
+    fragments = g.derived.setdefault("text_fragments", {})
+    if i not in fragments:
+        lo, hi = g.out_offsets[i], g.out_offsets[i + 1]
+        fragments[i] = [
+            (g.out_targets[slot], f"- {g.labels[i]} {SIGN_ARROWS[g.out_signs[slot]]} → {g.labels[g.out_targets[slot]]}")
+            for slot in range(lo, hi)
+        ]
+    return fragments[i]
+
+def _path_fragments(g, i, target, k):
+    """The top-k path lines from node index i, cached per (node, target, k)."""
+    fragments = g.derived.setdefault("text_paths", {})
+    key = (i, target, k)
+    if key not in fragments:
+        fragments[key] = [f"- Path: {format_path(g, path, signs)}" for path, signs, _ in top_k_paths(g, g.ids[i], target, k)]
+    return fragments[key]
+
+def kg_to_text_scoped(kg, focus, hops=2, paths=0, target=None, token_budget=1000, count_tokens=approx_tokens):
+    """
+    kg_to_text restricted to the part of the graph around the focus nodes, for
+    prompt grounding. focus holds node ids or free-text names (resolved with
+    search_index). With paths > 0, the strongest paths from each focus node to
+    target (default SPX/UST, see top_k_paths) come first. Then come the edges
+    inside the hops-step neighbourhood of the focus nodes (in- and out-edges),
+    closest nodes first. Lines are added until token_budget (measured with
+    count_tokens) would be exceeded. Per-node edge lines and path lines are
+    cached on the compiled graph, so repeated prompts over the same graph only
+    re-join text. Returns "" when no focus node is found.
+    """
+    g = compile_kg(kg)
+    index = search_index(g)
+    start = []
+    for item in focus:
+        node_id = item if item in g.index else index.resolve(item)
+        if node_id is not None and g.index[node_id] not in start:
+            start.append(g.index[node_id])
+    if not start:
+        return ""
+
+    lines = ["The monetary policy transmission knowledge graph (relevant part):"]
+    budget = token_budget - count_tokens(lines[0])
+    candidates = []
+    if paths:
+        for i in start:
+            candidates.extend(_path_fragments(g, i, target, paths))
+
+    # Neighbourhood in distance order, following edges both ways
+    order = list(start)
+    seen = set(start)
+    frontier = list(start)
+    for _ in range(hops):
+        nxt = []
+        for i in frontier:
+            for j, _ in list(g.out_edges_of(i)) + list(g.in_edges_of(i)):
+                if j not in seen:
+                    seen.add(j)
+                    nxt.append(j)
+        order.extend(nxt)
+        frontier = nxt
+    for i in order:
+        candidates.extend(line for j, line in _text_fragments(g, i) if j in seen)
+
+    for n, line in enumerate(candidates):
+        cost = count_tokens(line)
+        if cost > budget:
+            lines.append(f"- ... ({len(candidates) - n} more relationships omitted)")
+            break
+        lines.append(line)
+        budget -= cost
+    return "\n".join(lines)
+
 # Step 3: Integrate with an LLM Agent (simulated)
-def trace_transmission(kg, start_node, shock_direction):
+def trace_transmission(kg, start_node, shock_direction, max_depth=8, max_paths=None, time_limit=None):
     """
     Trace and print the transmission steps from a starting node (e.g., 'policy_rate')
     with a given shock direction ('+' for increase, '-' for decrease).
     Now supports bidirectional edges with sign '+/-'.
+    max_depth, max_paths and time_limit bound the search as in get_transmission_paths;
+    the (possibly truncated) PathResults are returned after printing.
+    kg may be the raw dict or a CompiledKG.
     """
-    node_labels = {n["id"]: n["label"] for n in kg["nodes"]}
-    from collections import deque
-    # Expanded targets to include more macroeconomic endpoints for richer transmission tracing
-    targets = {"output", "prices", "SPX", "UST", "inflation", "inflation_expectations", "behavior_change", "supply_demand_imbalance", "global_costs", "production", "deflation"}
-    results = []
-    queue = deque()
-    queue.append((start_node, [start_node], shock_direction))
-    while queue:
-        node, path, sign = queue.popleft()
-        if node in targets and node != start_node:
-            results.append((path, sign))
-            continue
-        for edge in kg["edges"]:
-            if edge["source"] == node:
-                edge_sign = edge["sign"]
-                if edge_sign == "+/-":
-                    # For bidirectional, propagate both + and -
-                    queue.append((edge["target"], path + [edge["target"]], '+'))
-                    queue.append((edge["target"], path + [edge["target"]], '-'))
-                else:
-                    next_sign = sign if edge_sign == "+" else ('-' if sign == '+' else '+')
-                    queue.append((edge["target"], path + [edge["target"]], next_sign))
+    g = compile_kg(kg)
+    results = get_transmission_paths(g, start_node, shock_direction, max_depth, max_paths, time_limit)
     # Print steps
     for path, final_sign in results:
         step_str = ""
         for i in range(len(path)-1):
-            src = node_labels[path[i]]
-            tgt = node_labels[path[i+1]]
-            edge = next(e for e in kg["edges"] if e["source"] == path[i] and e["target"] == path[i+1])
-            edge_sign = edge["sign"]
+            src = g.label(path[i])
+            edge_sign = g.edge_sign(path[i], path[i+1])
             if edge_sign == "+/-":
                 arrow = "↑/↓"
             else:
                 arrow = "↑" if edge_sign == "+" else "↓"
             step_str += f"{src} {arrow} → "
-        step_str += f"{node_labels[path[-1]]} (net effect: {'↑' if final_sign == '+' else '↓'})"
+        step_str += f"{g.label(path[-1])} (net effect: {'↑' if final_sign == '+' else '↓'})"
         print(step_str)
+    if results.truncated:
+        print(f"(search stopped early: {results.truncated} reached)")
+    return results
 
 # Step 4: Example usage
 import sys
@@ -164,202 +279,280 @@ def plot_transmission_graph(kg, start_node=None, highlight_paths=None, save_path
         print(f"Graph saved to {save_path}")
     plt.show()
 
-def get_transmission_paths(kg, start_node, shock_direction):
+def get_transmission_paths(kg, start_node, shock_direction, max_depth=8, max_paths=None, time_limit=None):
     """
     Return all transmission paths and their net sign from start_node to targets.
     Now supports bidirectional edges with sign '+/-'.
+    Paths are simple (no node is visited twice), so feedback loops such as
+    the_fed → policy_rate → debt_servicing_costs → government → the_fed cannot
+    grow the queue forever. The search is further bounded by max_depth (edges per
+    path), max_paths (results) and time_limit (seconds); when one of them cuts the
+    search short, the partial results come back with .truncated set to its name.
+    kg may be the raw dict or a CompiledKG.
+    Returns: PathResults (a list) of (path, net_sign).
     """
-    from collections import deque
-    # Expanded targets to include more macroeconomic endpoints for richer transmission tracing
-    targets = {"output", "prices", "SPX", "UST", "inflation", "inflation_expectations", "behavior_change", "supply_demand_imbalance", "global_costs", "production", "deflation"}
-    results = []
+    g = compile_kg(kg)
+    target_ids = {g.index[t] for t in TRANSMISSION_TARGETS if t in g.index}
+    start = g.index.get(start_node)
+    results = PathResults()
+    if start is None:
+        return results
+    deadline = Deadline(time_limit)
+    # Queued paths live in a parent-pointer arena instead of copied lists
+    arena = PathTrie(g)
     queue = deque()
-    queue.append((start_node, [start_node], shock_direction))
+    queue.append((arena.push(-1, start), 1, shock_direction))
     while queue:
-        node, path, sign = queue.popleft()
-        if node in targets and node != start_node:
-            results.append((path, sign))
+        if deadline.expired():
+            results.truncated = "time_limit"
+            break
+        entry, length, sign = queue.popleft()
+        node = arena.nodes[entry]
+        if node in target_ids and node != start:
+            results.append((arena.path_at(entry)[0], sign))
+            if max_paths is not None and len(results) >= max_paths:
+                if queue:
+                    results.truncated = "max_paths"
+                break
             continue
-        for edge in kg["edges"]:
-            if edge["source"] == node:
-                edge_sign = edge["sign"]
-                if edge_sign == "+/-":
-                    queue.append((edge["target"], path + [edge["target"]], '+'))
-                    queue.append((edge["target"], path + [edge["target"]], '-'))
-                else:
-                    next_sign = sign if edge_sign == "+" else ('-' if sign == '+' else '+')
-                    queue.append((edge["target"], path + [edge["target"]], next_sign))
+        at_limit = max_depth is not None and length > max_depth
+        for target, edge_sign in g.out_edges_of(node):
+            if arena.on_path(entry, target):
+                continue
+            if at_limit:
+                results.truncated = "max_depth"
+                break
+            if edge_sign == AMBIGUOUS:
+                # For bidirectional, propagate both + and -
+                queue.append((arena.push(entry, target, True), length + 1, '+'))
+                queue.append((arena.push(entry, target, False), length + 1, '-'))
+            else:
+                next_sign = sign if edge_sign == POSITIVE else ('-' if sign == '+' else '+')
+                queue.append((arena.push(entry, target, next_sign == '+'), length + 1, next_sign))
     return results
 # --- New: Find all traces between two nodes, showing up/down arrows for each node ---
-def all_traces_between(kg, source_node, desti_node, max_depth=8, topk=3):
+def iter_traces_between(kg, source_node, desti_node, max_depth=8, symbolic=False):
     """
-    Return all possible traces (paths) from source_node to desti_node, with their net sign and per-node effect.
-    Uses DFS up to max_depth to avoid infinite cycles.
-    Returns: list of (path_with_arrows, net_sign), where path_with_arrows is a list of "NodeLabel (arrow)".
-    If topk is provided, only print the topk paths.
+    Lazily yield the traces all_traces_between returns, one (path_with_arrows, net_sign)
+    at a time in DFS order, so callers can stop after the first few.
+    symbolic=True yields each trace once instead of once per branch of its "+/-"
+    edges, with "↑/↓" from the first "+/-" edge on.
+    kg may be the raw dict or a CompiledKG.
     """
-    results = []
-    stack = [(source_node, [source_node], [])]  # (current, path, list of signs)
-    node_labels = {n["id"]: n["label"] for n in kg["nodes"]}
-    while stack:
-        node, path, signs = stack.pop()
-        if node == desti_node and node != source_node:
+    g = compile_kg(kg)
+    source = g.index.get(source_node)
+    desti = g.index.get(desti_node)
+    if source is None or desti is None:
+        return
+    # Moves into nodes that can never reach desti are skipped (see reachability)
+    dead = reachability(g, signed=False).bound({desti})
+    path = [source]
+    signs = []
+    # One list of pending (target, arrow) moves per path position; popping from
+    # the end visits them in the order the original copying stack did
+    frames = [_trace_moves(g, source, None, symbolic)] if max_depth >= 1 else []
+    while frames:
+        moves = frames[-1]
+        if not moves:
+            frames.pop()
+            if len(path) > 1:
+                path.pop()
+                signs.pop()
+            continue
+        target, arrow = moves.pop()
+        if dead[2 * target]:
+            continue
+        if target == desti and target != source:
             # Attach arrows to each node label except the first (source)
-            path_with_arrows = []
-            for i, n in enumerate(path):
-                if i == 0:
-                    path_with_arrows.append(node_labels[n])
-                else:
-                    arrow = signs[i-1] if i-1 < len(signs) else ""
-                    path_with_arrows.append(f"{node_labels[n]} ({arrow})")
+            path_with_arrows = [g.labels[source]]
+            for n, a in zip(path[1:] + [target], signs + [arrow]):
+                path_with_arrows.append(f"{g.labels[n]} ({a})")
             # Net sign is the last arrow in the path
-            net_sign = signs[-1] if signs else ""
-            results.append((path_with_arrows, net_sign))
-            if topk is not None and len(results) >= topk:
-                break
+            yield path_with_arrows, arrow
             continue
-        if len(path) > max_depth:
+        if len(path) + 1 > max_depth:
             continue
-        for edge in kg["edges"]:
-            if edge["source"] == node:
-                edge_sign = edge["sign"]
-                # Determine next possible sign(s) and arrow(s)
-                if not signs:
-                    # First edge: use edge sign
-                    if edge_sign == "+/-":
-                        stack.append((edge["target"], path + [edge["target"]], signs + ['↑']))
-                        stack.append((edge["target"], path + [edge["target"]], signs + ['↓']))
-                    else:
-                        arrow = '↑' if edge_sign == '+' else '↓'
-                        stack.append((edge["target"], path + [edge["target"]], signs + [arrow]))
-                else:
-                    prev = signs[-1]
-                    if edge_sign == "+/-":
-                        stack.append((edge["target"], path + [edge["target"]], signs + ['↑']))
-                        stack.append((edge["target"], path + [edge["target"]], signs + ['↓']))
-                    else:
-                        if prev == '↑':
-                            arrow = '↑' if edge_sign == '+' else '↓'
-                        elif prev == '↓':
-                            arrow = '↓' if edge_sign == '+' else '↑'
-                        else:
-                            arrow = prev  # fallback
-                        stack.append((edge["target"], path + [edge["target"]], signs + [arrow]))
+        path.append(target)
+        signs.append(arrow)
+        frames.append(_trace_moves(g, target, arrow, symbolic))
+
+def _trace_moves(g, node, prev, symbolic=False):
+    """(target, arrow) moves out of node index node for all_traces_between, in push order."""
+    moves = []
+    for target, edge_sign in g.out_edges_of(node):
+        # Determine next possible sign(s) and arrow(s)
+        if edge_sign == AMBIGUOUS or prev == '↑/↓':
+            if symbolic:
+                moves.append((target, '↑/↓'))
+            else:
+                moves.append((target, '↑'))
+                moves.append((target, '↓'))
+        elif prev is None:
+            # First edge: use edge sign
+            moves.append((target, '↑' if edge_sign == POSITIVE else '↓'))
+        elif prev == '↑':
+            moves.append((target, '↑' if edge_sign == POSITIVE else '↓'))
+        else:
+            moves.append((target, '↓' if edge_sign == POSITIVE else '↑'))
+    return moves
+
+def all_traces_between(kg, source_node, desti_node, max_depth=8, topk=3, weighted=False, cache=None, symbolic=False):
+    """
+    Return all possible traces (paths) from source_node to desti_node, with their net sign and per-node effect.
+    Uses DFS up to max_depth to avoid infinite cycles.
+    Returns: list of (path_with_arrows, net_sign), where path_with_arrows is a list of "NodeLabel (arrow)".
+    If topk is provided, the search stops after topk paths and prints them.
+    If weighted is True, the topk strongest simple paths by edge "strength" are
+    returned instead of the first ones the DFS meets (see top_k_paths).
+    cache: optional QueryCache; identical queries on an unchanged graph reuse its result.
+    symbolic: list each trace once with "↑/↓" from its first "+/-" edge on, instead of
+    once per branch (see iter_traces_between); ignored when weighted.
+    kg may be the raw dict or a CompiledKG.
+    """
+    results = None
+    if cache is not None:
+        key = cache.key(kg, "all_traces_between", source=source_node, target=desti_node,
+                        max_depth=max_depth, topk=topk, weighted=weighted, symbolic=symbolic)
+        results = cache.get(key)
+    if results is None:
+        if weighted:
+            g = compile_kg(kg)
+            results = []
+            for path, signs, _ in top_k_paths(g, source_node, desti_node, topk, None, max_depth):
+                arrows = ['↑' if sign == '+' else '↓' for sign in signs]
+                path_with_arrows = [g.label(path[0])] + [f"{g.label(n)} ({a})" for n, a in zip(path[1:], arrows)]
+                results.append((path_with_arrows, arrows[-1]))
+        else:
+            results = list(islice(iter_traces_between(kg, source_node, desti_node, max_depth, symbolic), topk))
+        if cache is not None:
+            cache.put(key, results)
     # Print topk paths if requested
     if topk is not None:
-        for i, (path_with_arrows, net_sign) in enumerate(results[:topk]):
+        for i, (path_with_arrows, net_sign) in enumerate(results):
             label_path = " → ".join(path_with_arrows)
             print(f"Path {i+1}: {label_path} (net effect: {net_sign})")
     return results
 
-def make_scenario(kg, source_node=None, desti_node=None, max_depth=8, topk=10, direction=None, out_fname=None):
+def _loop_summary(g, members, shown=4):
+    """Labels of a feedback component's first members, with a count of the rest."""
+    names = ", ".join(g.labels[g.index[node_id]] for node_id in members[:shown])
+    return names if len(members) <= shown else f"{names} +{len(members) - shown} more"
+
+def make_scenario(kg, source_node=None, desti_node=None, max_depth=8, topk=10, direction=None, out_fname=None, count_only=False, weighted=False, cache=None, workers=None, symbolic=False, constraints=None, components=False, ordered=True):
     """
     Print all possible paths from source_node to SPX/UST, or all paths to desti_node.
     If only source_node is given, finds all paths from source_node to 'SPX' or 'UST'.
-    If only desti_node is given, finds all paths from any node to desti_node.
+    If only desti_node is given, finds all paths from any node to desti_node,
+    streaming them from a hop-distance-pruned search per start node (iter_paths),
+    so they come out in the same order as source queries. ordered=False finds the
+    same paths with one backward traversal from desti_node instead
+    (iter_paths(ordered=False)), which is faster on large graphs but lists them
+    in traversal order; it applies to single-process, non-symbolic runs.
     Handles loops by limiting path length with max_depth.
     direction: "higher" or "lower" - only show paths with net effect up (↑) or down (↓)
     Shows up/down arrow next to each node.
     Prints total count of filtered paths.
-    If out_fname is provided, writes all filtered paths to the file.
+    If out_fname is provided, streams all filtered paths to the file as they are found.
+    If count_only is True, the total comes from count_paths and only the topk
+    displayed paths are enumerated; those are what gets returned and written to
+    out_fname. count_paths counts walks, so when a feedback loop lies between the
+    endpoints (counts_exact) the total is printed as "at most N"; when fewer than
+    topk paths exist (or topk is None) they are all enumerated and counted exactly.
+    If weighted is True, the topk paths are the strongest ones by edge "strength"
+    (top_k_paths), strongest first, and the total is counted as with count_only.
+    cache: optional QueryCache; identical queries on an unchanged graph replay the
+    cached paths (still printed and written to out_fname) instead of searching again.
+    workers: optional process count for a full enumeration (not count_only/weighted);
+    the search is split by start node or first hop (iter_paths_parallel) and the
+    paths come back in the same order as the single-process search.
+    symbolic: enumerate each structural path once, marking effects from its first
+    "+/-" edge on "↑/↓" (iter_paths(symbolic=True)); a "↑/↓" path counts for either
+    direction, and the total counts structural paths. Ignored when weighted,
+    and not combined with count_only (whose DP counts concrete branches).
+    constraints: optional iter_constrained_paths keywords (via, avoid, node_types,
+    relations, edge_signs), e.g. {"avoid": ["central_bank_credibility"]}. They are
+    applied during the search, which then runs single-process (weighted,
+    count_only and workers are not used) and totals the matching paths.
+    components: under each printed path, list the feedback loops (cyclic strongly
+    connected components, feedback_components_of) it runs through, by label
+    (the first few members of each).
+    Returns the filtered paths as a PathTrie, which iterates as (path, signs) pairs.
+    kg may be the raw dict or a CompiledKG.
     """
-    node_labels = {n["id"]: n["label"] for n in kg["nodes"]}
-    targets = {"SPX", "UST"} if desti_node is None else {desti_node}
-    results = []
-
-    def get_arrow(sign):
-        return "↑" if sign == "+" else "↓"
-
-    # Helper to get all paths with sign propagation
-    def all_paths_with_signs(start, targets, max_depth):
-        stack = [(start, [start], [])]  # (node, path, signs)
-        paths = []
-        while stack:
-            node, path, signs = stack.pop()
-            if node in targets and node != start:
-                paths.append((list(path), list(signs)))
-                continue
-            if len(path) > max_depth:
-                continue
-            for edge in kg["edges"]:
-                if edge["source"] == node and edge["target"] not in path:
-                    edge_sign = edge["sign"]
-                    if not signs:
-                        # First edge
-                        if edge_sign == "+/-":
-                            stack.append((edge["target"], path + [edge["target"]], signs + ["+"]))
-                            stack.append((edge["target"], path + [edge["target"]], signs + ["-"]))
-                        else:
-                            stack.append((edge["target"], path + [edge["target"]], signs + [edge_sign]))
-                    else:
-                        prev = signs[-1]
-                        if edge_sign == "+/-":
-                            stack.append((edge["target"], path + [edge["target"]], signs + ["+"]))
-                            stack.append((edge["target"], path + [edge["target"]], signs + ["-"]))
-                        else:
-                            # Propagate sign
-                            if prev == "+":
-                                next_sign = edge_sign
-                            elif prev == "-":
-                                next_sign = "+" if edge_sign == "-" else "-"
-                            else:
-                                next_sign = edge_sign
-                            stack.append((edge["target"], path + [edge["target"]], signs + [next_sign]))
-        return paths
-
-    if source_node:
-        all_paths = all_paths_with_signs(source_node, targets, max_depth)
-    elif desti_node:
-        all_paths = []
-        for start in [n["id"] for n in kg["nodes"] if n["id"] != desti_node]:
-            all_paths.extend(all_paths_with_signs(start, {desti_node}, max_depth))
-    else:
+    if not source_node and not desti_node:
         print("Please provide either a source_node or desti_node.")
         return
 
-    # Filter by direction if specified
-    filtered_paths = []
-    for path, signs in all_paths:
-        if not signs:
-            continue
-        net_sign = signs[-1]
-        if direction and direction.lower() == "higher" and net_sign != "+":
-            continue
-        if direction and direction.lower() == "lower" and net_sign != "-":
-            continue
-        filtered_paths.append((path, signs))
-
-    # Print results
-    for i, (path, signs) in enumerate(filtered_paths[:topk]):
-        label_path = []
-        for idx, n in enumerate(path):
-            if idx == 0:
-                label_path.append(node_labels[n])
-            else:
-                arrow = get_arrow(signs[idx-1])
-                label_path.append(f"{node_labels[n]} ({arrow})")
-        print(f"Path {i+1}: {' → '.join(label_path)}")
-    print(f"Total paths: {len(filtered_paths)}")
-    if not filtered_paths:
-        print("No paths found.")
+    g = compile_kg(kg)
+    cached = None
+    if cache is not None:
+        # Sets (avoid, node_types, ...) as sorted lists so the key does not depend on hash order
+        # (a single string is one value, as in iter_constrained_paths)
+        settings = {name: None if value is None else sorted(_as_set(value))
+                    for name, value in (constraints or {}).items()}
+        key = cache.key(g, "make_scenario", source=source_node, target=desti_node, max_depth=max_depth,
+                        direction=direction, topk=topk, count_only=count_only, weighted=weighted,
+                        symbolic=symbolic, constraints=settings, ordered=ordered)
+        cached = cache.get(key)
+    total = None
+    # Totals from the count_paths DP rather than from the enumeration; with
+    # topk=None every path is enumerated anyway, so the count is exact
+    counted = not constraints and topk is not None and ((count_only and not symbolic) or weighted)
+    if cached is not None:
+        paths, total = iter(cached[0]), cached[1]
+    elif constraints:
+        paths = iter_constrained_paths(g, source_node, desti_node, direction, max_depth, symbolic=symbolic, **constraints)
+    elif weighted:
+        ranked = top_k_paths(g, source_node, desti_node, topk, direction, max_depth)
+        paths = ((path, signs) for path, signs, _ in ranked)
+    elif workers and (symbolic or not count_only):
+        paths = iter_paths_parallel(g, source_node, desti_node, direction, max_depth, workers, symbolic=symbolic)
+    else:
+        paths = iter_paths(g, source_node, desti_node, direction, max_depth, ordered=ordered, symbolic=symbolic)
+    if total is None and counted:
+        total = total_paths(count_paths(g, source_node, desti_node, max_depth), direction)
+        paths = islice(paths, topk)
+
+    total_text = total
+    if counted and not counts_exact(g, source_node, desti_node):
+        total_text = f"at most {total} (walk count; feedback loops lie between the endpoints)"
 
-    # Write all filtered paths to file if requested
+    # Print the first topk paths as soon as they are found
+    filtered_paths = PathTrie(g)
+    def collect(paths):
+        for path, signs in paths:
+            if topk is None or len(filtered_paths) < topk:
+                print(f"Path {len(filtered_paths)+1}: {format_path(g, path, signs)}")
+                loops = feedback_components_of(g, path) if components else []
+                if loops:
+                    print(f"  Feedback loops: {' | '.join(_loop_summary(g, members) for members in loops)}")
+            filtered_paths.add(path, signs)
+            yield path, signs
+    stream = collect(paths)
+
+    def final_total():
+        # Fewer than topk paths means the enumeration ran out: it saw every path
+        if not counted or len(filtered_paths) < topk:
+            return len(filtered_paths), len(filtered_paths)
+        return total, total_text
+
+    # Stream all filtered paths to file if requested; write_paths drives the
+    # search, so only file errors are caught and search errors propagate
     if out_fname:
         try:
-            with open(out_fname, "w", encoding="utf-8") as f:
-                for i, (path, signs) in enumerate(filtered_paths):
-                    label_path = []
-                    for idx, n in enumerate(path):
-                        if idx == 0:
-                            label_path.append(node_labels[n])
-                        else:
-                            arrow = get_arrow(signs[idx-1])
-                            label_path.append(f"{node_labels[n]} ({arrow})")
-                    f.write(f"Path {i+1}: {' → '.join(label_path)}\n")
-                f.write(f"Total paths: {len(filtered_paths)}\n")
-        except Exception as e:
+            write_paths(g, stream, out_fname, fmt="text", total=lambda: final_total()[1])
+        except OSError as e:
             print(f"Failed to write paths to {out_fname}: {e}")
+    for _ in stream:
+        pass
+
+    total, total_text = final_total()
+    print(f"Total paths: {total_text}")
+    if not total:
+        print("No paths found.")
 
+    if cache is not None and cached is None:
+        cache.put(key, (list(filtered_paths), total))
     return filtered_paths
 
 # --- New: Pyvis visualization with legend ---
@@ -367,7 +560,7 @@ def plot_pyvis_transmission(kg, paths, output_html="transmission_pyvis.html"):
     """
     Plot the knowledge graph using pyvis, highlighting the given paths.
     Displays a legend for node types and edge signs.
-    paths: list of (path, sign)
+    paths: list of (path, sign), or a PathTrie
     output_html: file to save the interactive visualization
     """
     try:
@@ -389,13 +582,18 @@ def plot_pyvis_transmission(kg, paths, output_html="transmission_pyvis.html"):
     }
     net = Network(height="800px", width="100%", directed=True, notebook=False)
     # Determine which nodes are in highlighted paths
-    highlight_nodes = set()
-    highlight_edges = set()
-    for path, sign in paths:
-        for i in range(len(path)):
-            highlight_nodes.add(path[i])
-        for i in range(len(path)-1):
-            highlight_edges.add((path[i], path[i+1]))
+    if isinstance(paths, PathTrie):
+        # Read the highlight sets straight off the shared prefixes
+        highlight_nodes = paths.node_ids()
+        highlight_edges = paths.edge_pairs()
+    else:
+        highlight_nodes = set()
+        highlight_edges = set()
+        for path, sign in paths:
+            for i in range(len(path)):
+                highlight_nodes.add(path[i])
+            for i in range(len(path)-1):
+                highlight_edges.add((path[i], path[i+1]))
     # Add nodes
     for node in kg["nodes"]:
         color = type_color.get(node.get("type", "METRIC"), "#cccccc")
@@ -472,6 +670,13 @@ if __name__ == "__main__":
     #     label_path = " → ".join(node_labels[n] for n in path)
     #     print(f"Path {i+1}: {label_path} (net effect: {'↑' if sign == '+' else '↓' if sign == '-' else sign})")
     
+    # Cross-domain tracing over sample_kg merged with the JSON sections
+    # from knowledge_graph_merge import load_unified_kg
+    # unified_kg = load_unified_kg()
+    # make_scenario(unified_kg, source_node="policy_rate", desti_node="implied_share_price", max_depth=10)
+
+    # Reuse the destination sweep across runs until sample_kg changes
+    cache = QueryCache(cache_dir=".kg_cache")
     paths = make_scenario(sample_kg,desti_node="inflation", max_depth=8, topk=10, direction="higher", 
-                          out_fname="inflation_paths.txt")
+                          out_fname="inflation_paths.txt", cache=cache)
     plot_pyvis_transmission(sample_kg, paths, output_html="inflation_expectation_to_inflation.html")
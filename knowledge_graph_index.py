@@ -0,0 +1,305 @@
+# knowledge_graph_index.py
+import json
+import sys
+from array import array
+
+# Integer sign codes used by the compiled graph. "+/-" edges are ambiguous:
+# the traversals branch on them instead of multiplying through.
+POSITIVE = 1
+NEGATIVE = -1
+AMBIGUOUS = 0
+
+SIGN_CODES = {"+": POSITIVE, "-": NEGATIVE, "+/-": AMBIGUOUS}
+SIGN_STRINGS = {POSITIVE: "+", NEGATIVE: "-", AMBIGUOUS: "+/-"}
+
+# Fields held in CompiledKG's columns; anything else is kept as a sparse extra
+_NODE_COLUMNS = {"id", "label", "type"}
+_EDGE_COLUMNS = {"source", "target", "relation", "sign", "strength"}
+
+
+class CompiledKG:
+    """
+    Read-only adjacency index built once from a {"nodes", "edges"} knowledge graph.
+
+    Node ids are interned to consecutive integers (declared nodes first, in file
+    order, then any ids that only appear on edges). Out-edges and in-edges are
+    stored CSR-style: the edges of node i live in positions
+    out_offsets[i]:out_offsets[i+1] of out_targets / out_signs, in the same order
+    as they appear in kg["edges"], so traversals visit neighbours exactly as the
+    plain dict scans did. Relations and node types are stored as small integer
+    codes into relation_names / type_names, and labels are interned strings.
+
+    The object also behaves like the original dict for kg["nodes"] / kg["edges"],
+    so it can be passed to any function that expects the raw graph. With
+    keep_source=False the per-node and per-edge dicts are not kept: only the
+    columns (plus any extra fields such as "strength" or "p_positive", stored
+    sparsely) stay in memory, and kg["nodes"] / kg["edges"] are rebuilt from them
+    on each access (see to_dict). edge_signs, the (source, target) -> sign dict
+    behind edge_sign, is not built either (None): it would repeat out_signs with
+    a tuple key per edge, so edge_sign scans the CSR arrays instead.
+
+    Edges without a sign are compiled with default_sign ("+" by default: a
+    structural link passes the shock through unchanged; "+/-" for data that
+    only says one quantity feeds another). unsigned_edges holds their positions
+    so to_dict does not write back a sign the source never had.
+    """
+
+    __slots__ = (
+        "kg", "fingerprint", "ids", "index", "node_count", "labels", "type_names", "type_codes",
+        "relation_names", "edge_signs", "edge_count", "edge_sources", "edge_targets", "edge_sign_codes",
+        "edge_strengths", "edge_relations", "node_extras", "edge_extras", "unsigned_edges",
+        "out_offsets", "out_edges", "out_targets", "out_signs", "out_strengths", "out_relations",
+        "in_offsets", "in_edges", "in_sources", "in_signs", "in_strengths", "in_relations", "in_out_slots",
+        "derived",
+    )
+
+    def __init__(self, kg, keep_source=True, default_sign="+"):
+        self.kg = kg if keep_source else None
+        self.fingerprint = None  # content hash, filled in by graph_fingerprint
+        self.derived = {}  # structures computed once per graph (e.g. the SCC condensation)
+        self.ids = []
+        self.index = {}
+        for node in kg["nodes"]:
+            self._intern(node["id"])
+        self.node_count = len(self.ids)
+        for edge in kg["edges"]:
+            self._intern(edge["source"])
+            self._intern(edge["target"])
+
+        labels = {n["id"]: n["label"] for n in kg["nodes"]}
+        types = {n["id"]: n.get("type", "METRIC") for n in kg["nodes"]}
+        self.labels = [sys.intern(labels.get(node_id, node_id)) for node_id in self.ids]
+        self.type_names = []
+        type_table = {}
+        self.type_codes = array("H", (_code(self.type_names, type_table, types.get(node_id, "METRIC")) for node_id in self.ids))
+        self.node_extras = {}
+        self.edge_extras = {}
+        if not keep_source:
+            for i, node in enumerate(kg["nodes"]):
+                extra = {k: v for k, v in node.items() if k not in _NODE_COLUMNS}
+                if extra:
+                    self.node_extras[i] = extra
+
+        sources = array("l")
+        targets = array("l")
+        signs = array("b")
+        strengths = array("d")
+        relations = array("H")
+        self.relation_names = []
+        relation_table = {}
+        self.edge_signs = {} if keep_source else None
+        self.unsigned_edges = set()
+        for pos, edge in enumerate(kg["edges"]):
+            sign = edge.get("sign")
+            if sign is None:
+                sign = default_sign
+                self.unsigned_edges.add(pos)
+            # Optional transmission strength in (0, 1]; unweighted edges are full strength
+            strength = edge.get("strength", 1.0)
+            if not 0 < strength <= 1:
+                raise ValueError(f"Edge {edge['source']} -> {edge['target']} has strength {strength}; expected a value in (0, 1].")
+            sources.append(self.index[edge["source"]])
+            targets.append(self.index[edge["target"]])
+            signs.append(SIGN_CODES[sign])
+            strengths.append(strength)
+            relations.append(_code(self.relation_names, relation_table, edge.get("relation")))
+            if keep_source:
+                # First matching edge wins, like the original next(...) lookup
+                self.edge_signs.setdefault((edge["source"], edge["target"]), sign)
+            else:
+                extra = {k: v for k, v in edge.items() if k not in _EDGE_COLUMNS}
+                if extra:
+                    self.edge_extras[pos] = extra
+
+        self.edge_count = len(sources)
+        # Edge columns in kg["edges"] order
+        self.edge_sources = sources
+        self.edge_targets = targets
+        self.edge_sign_codes = signs
+        self.edge_strengths = strengths
+        self.edge_relations = relations
+        self.out_offsets, self.out_edges = _csr(sources, len(self.ids))
+        self.in_offsets, self.in_edges = _csr(targets, len(self.ids))
+        self.out_targets = array("l", (targets[e] for e in self.out_edges))
+        self.out_signs = array("b", (signs[e] for e in self.out_edges))
+        self.out_strengths = array("d", (strengths[e] for e in self.out_edges))
+        self.out_relations = array("H", (relations[e] for e in self.out_edges))
+        self.in_sources = array("l", (sources[e] for e in self.in_edges))
+        self.in_signs = array("b", (signs[e] for e in self.in_edges))
+        self.in_strengths = array("d", (strengths[e] for e in self.in_edges))
+        self.in_relations = array("H", (relations[e] for e in self.in_edges))
+        # Position of each in-edge inside the out-edge arrays, so a backward
+        # walk can tell which out-edge slot a forward walk would have used
+        out_slot_of_edge = array("l", [0] * self.edge_count)
+        for slot, e in enumerate(self.out_edges):
+            out_slot_of_edge[e] = slot
+        self.in_out_slots = array("l", (out_slot_of_edge[e] for e in self.in_edges))
+
+    def _intern(self, node_id):
+        if node_id not in self.index:
+            node_id = sys.intern(node_id)
+            self.index[node_id] = len(self.ids)
+            self.ids.append(node_id)
+
+    def __getitem__(self, key):
+        return self.to_dict()[key]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getstate__(self):
+        if "snapshot_path" in self.derived:
+            # Memory-mapped graphs travel as their file path and are re-mapped on
+            # arrival, so worker processes share the snapshot's pages
+            return {"snapshot_path": self.derived["snapshot_path"]}
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        if "snapshot_path" in state:
+            from knowledge_graph_snapshot import load_snapshot
+            loaded = load_snapshot(state["snapshot_path"])
+            state = {name: getattr(loaded, name) for name in self.__slots__}
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def to_dict(self):
+        """
+        The graph as a {"nodes", "edges"} dict: the source dict when it was kept,
+        otherwise a fresh one rebuilt from the columns (missing types then read
+        "METRIC", as the index treats them; edges that had no sign get none).
+        """
+        if self.kg is not None:
+            return self.kg
+        nodes = []
+        for i in range(self.node_count):
+            node = {"id": self.ids[i], "label": self.labels[i], "type": self.type_names[self.type_codes[i]]}
+            node.update(self.node_extras.get(i, ()))
+            nodes.append(node)
+        edges = []
+        for e in range(self.edge_count):
+            edge = {"source": self.ids[self.edge_sources[e]], "target": self.ids[self.edge_targets[e]]}
+            relation = self.relation_names[self.edge_relations[e]]
+            if relation is not None:
+                edge["relation"] = relation
+            if e not in self.unsigned_edges:
+                edge["sign"] = SIGN_STRINGS[self.edge_sign_codes[e]]
+            if self.edge_strengths[e] != 1.0:
+                edge["strength"] = self.edge_strengths[e]
+            edge.update(self.edge_extras.get(e, ()))
+            edges.append(edge)
+        return {"nodes": nodes, "edges": edges}
+
+    def edge_attr(self, e, name, default=None):
+        """Value of an optional field of edge position e (its index in kg["edges"])."""
+        if self.kg is not None:
+            return self.kg["edges"][e].get(name, default)
+        return self.edge_extras.get(e, {}).get(name, default)
+
+    def out_edges_of(self, i):
+        """Return (target_index, sign_code) pairs for the out-edges of node index i."""
+        lo, hi = self.out_offsets[i], self.out_offsets[i + 1]
+        return zip(self.out_targets[lo:hi], self.out_signs[lo:hi])
+
+    def in_edges_of(self, i):
+        """Return (source_index, sign_code) pairs for the in-edges of node index i."""
+        lo, hi = self.in_offsets[i], self.in_offsets[i + 1]
+        return zip(self.in_sources[lo:hi], self.in_signs[lo:hi])
+
+    def edge_sign(self, source_id, target_id):
+        """Return the sign string of the first source -> target edge, or None."""
+        if self.edge_signs is not None:
+            return self.edge_signs.get((source_id, target_id))
+        # Compact or loaded from a snapshot: scan the source's out-edges, which keep file order
+        source, target = self.index.get(source_id), self.index.get(target_id)
+        if source is None or target is None:
+            return None
+        for t, sign in self.out_edges_of(source):
+            if t == target:
+                return SIGN_STRINGS[sign]
+        return None
+
+    def label(self, node_id):
+        i = self.index.get(node_id)
+        return node_id if i is None else self.labels[i]
+
+    def node_type(self, i):
+        """Type name of node index i."""
+        return self.type_names[self.type_codes[i]]
+
+    def relation(self, e):
+        """Relation name of edge position e, or None if the edge has none."""
+        return self.relation_names[self.edge_relations[e]]
+
+
+def _code(names, table, name):
+    """Intern name into the names list (table maps name -> code) and return its code."""
+    code = table.get(name)
+    if code is None:
+        code = table[name] = len(names)
+        names.append(sys.intern(name) if isinstance(name, str) else name)
+    return code
+
+
+def _csr(keys, n):
+    """
+    Stable counting sort of edge positions by key.
+    Returns (offsets, order) where order[offsets[k]:offsets[k+1]] are the edge
+    positions with key k, in their original order.
+    """
+    offsets = array("l", [0] * (n + 1))
+    for k in keys:
+        offsets[k + 1] += 1
+    for k in range(n):
+        offsets[k + 1] += offsets[k]
+    fill = array("l", offsets[:-1])
+    order = array("l", [0] * len(keys))
+    for pos, k in enumerate(keys):
+        order[fill[k]] = pos
+        fill[k] += 1
+    return offsets, order
+
+
+def compile_kg(kg):
+    """Return kg as a CompiledKG, compiling it if it is still a plain dict."""
+    if isinstance(kg, CompiledKG):
+        return kg
+    if hasattr(kg, "compiled"):
+        # MutableKG keeps its own compiled snapshot up to date
+        return kg.compiled()
+    return CompiledKG(kg)
+
+
+def compact_kg(kg):
+    """Compile kg without keeping its node/edge dicts (CompiledKG with keep_source=False)."""
+    if isinstance(kg, CompiledKG) and kg.kg is None:
+        return kg
+    return CompiledKG(compile_kg(kg).to_dict(), keep_source=False)
+
+
+def graph_sections(data):
+    """
+    The {"nodes", "edges"} graphs of a knowledge_graph_v2-style document, keyed
+    like the visualizer's sections: "Section" for a section that holds
+    machine_readable data itself, "Section - Subsection" for nested ones.
+    """
+    sections = {}
+    for key, value in data.items():
+        if key == "metadata" or not isinstance(value, dict):
+            continue
+        if "machine_readable" in value:
+            sections[key] = value["machine_readable"]
+            continue
+        for sub_key, sub_value in value.items():
+            if isinstance(sub_value, dict) and "machine_readable" in sub_value:
+                sections[f"{key} - {sub_key}"] = sub_value["machine_readable"]
+    return sections
+
+
+def load_compact_sections(file_path="data/knowledge_graph_v2_fixed.json"):
+    """
+    Load every graph section of a JSON knowledge graph file as a compact CompiledKG.
+    Section edges carry no sign, so they are compiled as "+/-", as merge_graphs does.
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {name: CompiledKG(graph, keep_source=False, default_sign="+/-") for name, graph in graph_sections(data).items()}
@@ -0,0 +1,125 @@
+# knowledge_graph_merge.py
+import json
+
+from knowledge_graph_index import CompiledKG, compile_kg, graph_sections
+from knowledge_graph_sample import sample_kg, section_aliases, section_links
+
+# Section name recorded on nodes and edges that come from sample_kg
+SAMPLE_SECTION = "sample_kg"
+# Section name recorded on the cross-section links
+LINK_SECTION = "links"
+
+# Active-voice relations whose target feeds into their source ("wacc depends_on
+# cost_of_equity"). Together with every passive "*_by" relation ("cost_of_equity
+# calculated_by capm", "risk mitigated_by hedging"), whose agent is the target,
+# they are flipped so every merged edge points the way a shock flows.
+INPUT_RELATIONS = {
+    "calculated_for", "calculated_from", "can_use", "depends_on", "derived_by_subtracting",
+    "derives_from_historical", "is_typically", "requires_data_from", "sum_of", "uses",
+    "uses_data_from", "uses_weight_of",
+}
+
+
+def flows_backwards(relation):
+    """Whether an edge with this relation points against the direction a shock flows."""
+    return relation is not None and (relation.endswith("_by") or relation in INPUT_RELATIONS)
+
+
+def _label(node_id):
+    return node_id.replace("_", " ").title()
+
+
+def merge_graphs(graphs, aliases=None, links=(), orient=True):
+    """
+    Merge several {"nodes", "edges"} graphs into one.
+
+    graphs: {section_name: graph}, merged in order. Nodes are deduplicated by id
+    (after applying aliases, {old_id: merged_id}); the first declaration keeps its
+    label and type, and ids that a section only uses on edges are declared with a
+    label made from the id. Edges are deduplicated by (source, target).
+    Every node and edge gets a "sections" list recording where it came from.
+    orient: flip edges whose relation flows backwards (every "*_by" relation plus
+    INPUT_RELATIONS; see flows_backwards), marked "reversed".
+    links: extra edges added last under the "links" section; a link replaces the
+    merged edge between the same two nodes.
+    Section edges without a sign are given "+/-": a structural link says one
+    quantity feeds another, not which way it moves it, so the signed searches
+    branch on it instead of reading it as "+". Sign the edges that matter
+    through links.
+    Returns the merged graph as a plain dict.
+    """
+    aliases = aliases or {}
+    nodes = {}
+    edges = {}
+
+    def declare(node_id, section, node=None):
+        merged = nodes.get(node_id)
+        if merged is None:
+            merged = nodes[node_id] = {"id": node_id, "label": _label(node_id), "type": "METRIC", "sections": []}
+            if node is not None:
+                merged.update({k: v for k, v in node.items() if k not in ("id", "sections")})
+        if section not in merged["sections"]:
+            merged["sections"].append(section)
+
+    def connect(edge, section, replace=False):
+        source = aliases.get(edge["source"], edge["source"])
+        target = aliases.get(edge["target"], edge["target"])
+        merged = dict(edge, source=source, target=target)
+        merged.setdefault("sign", "+/-")
+        if orient and section != LINK_SECTION and flows_backwards(merged.get("relation")):
+            merged["source"], merged["target"] = target, source
+            merged["reversed"] = True
+        key = (merged["source"], merged["target"])
+        if key in edges and not replace:
+            if section not in edges[key]["sections"]:
+                edges[key]["sections"].append(section)
+            return
+        sections = edges[key]["sections"] if key in edges else []
+        merged["sections"] = sections + ([section] if section not in sections else [])
+        edges[key] = merged
+        for node_id in key:
+            declare(node_id, section)
+
+    for section, graph in graphs.items():
+        for node in graph["nodes"]:
+            declare(aliases.get(node["id"], node["id"]), section, node)
+        for edge in graph["edges"]:
+            connect(edge, section)
+    for edge in links:
+        connect(edge, LINK_SECTION, replace=True)
+    return {"nodes": list(nodes.values()), "edges": list(edges.values())}
+
+
+def load_unified_kg(file_path="data/knowledge_graph_v2_fixed.json", include_sample=True,
+                    aliases=None, links=None, orient=True):
+    """
+    Load every section of a JSON knowledge graph file, plus sample_kg, as one
+    CompiledKG (see merge_graphs). sample_kg goes first, so its signed edges
+    and labels win over the sections. aliases and links default to
+    section_aliases / section_links from knowledge_graph_sample, which join
+    the macro graph to the valuation and risk sections. This lets one query run
+    across domains, e.g. make_scenario(kg, "policy_rate", "implied_share_price").
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    graphs = {SAMPLE_SECTION: sample_kg} if include_sample else {}
+    graphs.update(graph_sections(data))
+    merged = merge_graphs(
+        graphs,
+        aliases=section_aliases if aliases is None else aliases,
+        links=section_links if links is None else links,
+        orient=orient,
+    )
+    return CompiledKG(merged)
+
+
+def path_sections(kg, path):
+    """The sections a path of node ids crosses, in order (repeats merged)."""
+    g = compile_kg(kg)
+    sections_of = {node["id"]: node.get("sections", []) for node in g["nodes"]}
+    crossed = []
+    for node_id in path:
+        for section in sections_of.get(node_id, []):
+            if section not in crossed:
+                crossed.append(section)
+    return crossed
@@ -0,0 +1,293 @@
+# knowledge_graph_mutable.py
+from collections import defaultdict, deque
+
+from knowledge_graph_index import CompiledKG, SIGN_CODES, NEGATIVE, AMBIGUOUS
+from knowledge_graph_paths import _step
+
+# CompiledKG.derived entries that do not depend on edge signs
+_SIGN_FREE = ("condensation", ("reachability", False), "search_index")
+
+
+class _TrackedTarget:
+    """Maintained answers for one target: who can reach it, and path counts by depth."""
+
+    def __init__(self, target, max_depth):
+        self.target = target
+        self.max_depth = max_depth
+        self.ancestors = set()
+        # levels[d][node] = (paths up, paths down) from node to target with d edges
+        self.levels = [{target: (1, 0)}] + [{} for _ in range(max_depth)]
+        self.counts = {"+": [0] * (max_depth + 1), "-": [0] * (max_depth + 1)}
+
+
+class MutableKG:
+    """
+    Editable knowledge graph for interactive what-if work.
+
+    Holds its own copy of the {"nodes", "edges"} dict (so it can be passed to every
+    function that takes a kg) plus per-node out/in edge lists. Edits go through
+    add_node, add_edge, remove_edge and set_sign, which patch the adjacency lists in
+    place and update, for every tracked target, the set of nodes that can reach it
+    and the per-depth path counts that count_paths(kg, desti_node=target) would
+    return. Only the part of the graph upstream of the edited edge is revisited.
+
+    The CompiledKG used by the path engines is patched in place by set_sign,
+    keeping every derived structure that does not depend on signs (condensation,
+    unsigned reachability, search index). Structural edits rebuild the CSR arrays
+    lazily, once per batch of edits, the next time compiled() (or compile_kg)
+    asks for it; the derived structures those edits provably leave unchanged are
+    carried over to the rebuilt graph, provided every node id keeps its index:
+    the search index, and the reachability indexes when an added edge only links
+    states that were already reachable. Everything else is recomputed on demand.
+    """
+
+    def __init__(self, kg=None):
+        kg = kg or {"nodes": [], "edges": []}
+        self.kg = {"nodes": [dict(n) for n in kg["nodes"]], "edges": [dict(e) for e in kg["edges"]]}
+        self.declared = {n["id"] for n in self.kg["nodes"]}
+        self.out_edges = defaultdict(list)
+        self.in_edges = defaultdict(list)
+        for edge in self.kg["edges"]:
+            self.out_edges[edge["source"]].append(edge)
+            self.in_edges[edge["target"]].append(edge)
+        self.tracked = {}
+        self._compiled = None
+        # Derived structures to hand over to the next rebuilt CompiledKG
+        self._carry = {}
+
+    def __getitem__(self, key):
+        return self.kg[key]
+
+    def compiled(self):
+        """Return a CompiledKG for the current state, rebuilding it only after structural edits."""
+        if self._compiled is None:
+            g = CompiledKG(self.kg)
+            for key, value in self._carry.items():
+                # Ids that only appear on edges are numbered by first appearance,
+                # so an edge edit can renumber them even when no node comes or goes
+                if value.g.ids == g.ids:
+                    value.g = g
+                    g.derived[key] = value
+            self._carry = {}
+            self._compiled = g
+        return self._compiled
+
+    def _invalidate(self, keep=()):
+        """Drop the compiled graph, carrying over the derived entries named in keep."""
+        if self._compiled is not None:
+            self._carry = dict(self._compiled.derived)
+            self._compiled = None
+        self._carry = {key: value for key, value in self._carry.items() if key in keep}
+
+    def _has_node(self, node_id):
+        return node_id in self.declared or bool(self.out_edges.get(node_id)) or bool(self.in_edges.get(node_id))
+
+    def _still_reachable(self, source, target, sign):
+        """Derived keys of the reachability indexes that already contain source -> target."""
+        derived = self._compiled.derived if self._compiled is not None else self._carry
+        keep = []
+        for signed in (False, True):
+            reach = derived.get(("reachability", signed))
+            if reach is None:
+                continue
+            i, j = reach.g.index[source], reach.g.index[target]
+            if not signed:
+                states = [(i, j)]
+            elif SIGN_CODES[sign] == AMBIGUOUS:
+                states = [(2 * i + down, 2 * j + flip) for down in (0, 1) for flip in (0, 1)]
+            else:
+                states = [(2 * i + down, 2 * j + ((SIGN_CODES[sign] == NEGATIVE) != down)) for down in (0, 1)]
+            if all(reach.reachable_bits(a) >> b & 1 for a, b in states):
+                keep.append(("reachability", signed))
+        return keep
+
+    def _patch_sign(self, edge):
+        """Write edge's new sign into the compiled arrays, dropping the sign-dependent derived entries."""
+        g = self._compiled
+        e = next(pos for pos, other in enumerate(self.kg["edges"]) if other is edge)
+        code = SIGN_CODES[edge["sign"]]
+        g.edge_sign_codes[e] = code
+        g.unsigned_edges.discard(e)
+        i, j = g.index[edge["source"]], g.index[edge["target"]]
+        for slot in range(g.out_offsets[i], g.out_offsets[i + 1]):
+            if g.out_edges[slot] == e:
+                g.out_signs[slot] = code
+        for k in range(g.in_offsets[j], g.in_offsets[j + 1]):
+            if g.in_edges[k] == e:
+                g.in_signs[k] = code
+        # set_sign edits the first source -> target edge, the one edge_signs reports
+        g.edge_signs[(edge["source"], edge["target"])] = edge["sign"]
+        g.fingerprint = None
+        g.derived = {key: value for key, value in g.derived.items() if key in _SIGN_FREE or key == "out_lags"}
+
+    # --- Edits ---
+
+    def add_node(self, node_id, label=None, type="METRIC", **attrs):
+        if node_id in self.declared:
+            return
+        self.kg["nodes"].append({"id": node_id, "label": label or node_id, "type": type, **attrs})
+        self.declared.add(node_id)
+        # Node indices may shift (ids that only appeared on edges move up)
+        self._invalidate()
+        # A newly declared node becomes a start candidate for the tracked counts
+        for state in self.tracked.values():
+            if node_id != state.target:
+                for depth in range(1, state.max_depth + 1):
+                    pos, neg = state.levels[depth].get(node_id, (0, 0))
+                    state.counts["+"][depth] += pos
+                    state.counts["-"][depth] += neg
+
+    def add_edge(self, source, target, sign, relation="affects", **attrs):
+        if sign not in SIGN_CODES:
+            raise ValueError(f"Unknown edge sign {sign!r}; expected one of {sorted(SIGN_CODES)}.")
+        edge = {"source": source, "target": target, "relation": relation, "sign": sign, **attrs}
+        if self._has_node(source) and self._has_node(target):
+            self._invalidate(["search_index"] + self._still_reachable(source, target, sign))
+        else:
+            self._invalidate()
+        self.kg["edges"].append(edge)
+        self.out_edges[source].append(edge)
+        self.in_edges[target].append(edge)
+        for state in self.tracked.values():
+            self._grow_ancestors(state, source, target)
+            self._refresh_counts(state, source)
+        return edge
+
+    def remove_edge(self, source, target):
+        """Remove the first source -> target edge. Returns it, or None if there was none."""
+        edge = next((e for e in self.out_edges.get(source, []) if e["target"] == target), None)
+        if edge is None:
+            return None
+        self.out_edges[source].remove(edge)
+        self.in_edges[target].remove(edge)
+        self.kg["edges"].remove(edge)
+        self._invalidate(["search_index"] if self._has_node(source) and self._has_node(target) else ())
+        for state in self.tracked.values():
+            self._shrink_ancestors(state, source, target)
+            self._refresh_counts(state, source)
+        return edge
+
+    def set_sign(self, source, target, sign):
+        """Change the sign of the first source -> target edge."""
+        if sign not in SIGN_CODES:
+            raise ValueError(f"Unknown edge sign {sign!r}; expected one of {sorted(SIGN_CODES)}.")
+        edge = next((e for e in self.out_edges.get(source, []) if e["target"] == target), None)
+        if edge is None:
+            raise KeyError(f"No edge {source} -> {target}.")
+        edge["sign"] = sign
+        if self._compiled is not None:
+            self._patch_sign(edge)
+        else:
+            self._invalidate(_SIGN_FREE)
+        for state in self.tracked.values():
+            self._refresh_counts(state, source)
+        return edge
+
+    # --- Maintained queries ---
+
+    def track(self, target, max_depth=8):
+        """Start maintaining reachability and path counts for target."""
+        state = _TrackedTarget(target, max_depth)
+        self.tracked[target] = state
+        self._grow_ancestors(state, None, target)
+        for depth in range(1, max_depth + 1):
+            for node in self._upstream(state.levels[depth - 1]):
+                self._recount(state, node, depth)
+        return state
+
+    def can_reach(self, source, target):
+        """Whether source has any path to target (target must be tracked)."""
+        return source in self.tracked[target].ancestors
+
+    def path_counts(self, target):
+        """Per-sign, per-depth path counts to target, as count_paths would return them."""
+        counts = self.tracked[target].counts
+        return {"+": list(counts["+"]), "-": list(counts["-"])}
+
+    # --- Incremental maintenance ---
+
+    def _upstream(self, nodes):
+        return {edge["source"] for node in nodes for edge in self.in_edges.get(node, [])}
+
+    def _grow_ancestors(self, state, source, target):
+        """After adding source -> target, add source and its new ancestors (source None: from scratch)."""
+        if source is None:
+            seeds = [edge["source"] for edge in self.in_edges.get(target, [])]
+        elif target == state.target or target in state.ancestors:
+            seeds = [source]
+        else:
+            return
+        queue = deque(s for s in seeds if s != state.target and s not in state.ancestors)
+        state.ancestors.update(queue)
+        while queue:
+            node = queue.popleft()
+            for edge in self.in_edges.get(node, []):
+                prev = edge["source"]
+                if prev != state.target and prev not in state.ancestors:
+                    state.ancestors.add(prev)
+                    queue.append(prev)
+
+    def _shrink_ancestors(self, state, source, target):
+        """
+        After removing source -> target, only source and the ancestors that reach
+        the target through it can lose reachability: drop that region, then re-add
+        the members that still have another way in.
+        """
+        if source not in state.ancestors or (target != state.target and target not in state.ancestors):
+            return
+        region = {source}
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            for edge in self.in_edges.get(node, []):
+                prev = edge["source"]
+                if prev in state.ancestors and prev not in region:
+                    region.add(prev)
+                    queue.append(prev)
+        state.ancestors -= region
+        queue = deque(
+            node for node in region
+            if any(e["target"] == state.target or e["target"] in state.ancestors for e in self.out_edges.get(node, []))
+        )
+        state.ancestors.update(queue)
+        while queue:
+            node = queue.popleft()
+            for edge in self.in_edges.get(node, []):
+                prev = edge["source"]
+                if prev in region and prev not in state.ancestors:
+                    state.ancestors.add(prev)
+                    queue.append(prev)
+
+    def _recount(self, state, node, depth):
+        """Recompute levels[depth][node] from node's out-edges; return whether it changed."""
+        if node == state.target:
+            return False
+        pos = neg = 0
+        below = state.levels[depth - 1]
+        for edge in self.out_edges.get(node, []):
+            pair = below.get(edge["target"])
+            if pair is not None:
+                p, n = _step(pair, SIGN_CODES[edge.get("sign", "+")])
+                pos += p
+                neg += n
+        old = state.levels[depth].get(node, (0, 0))
+        if old == (pos, neg):
+            return False
+        if pos or neg:
+            state.levels[depth][node] = (pos, neg)
+        else:
+            state.levels[depth].pop(node, None)
+        if node in self.declared:
+            state.counts["+"][depth] += pos - old[0]
+            state.counts["-"][depth] += neg - old[1]
+        return True
+
+    def _refresh_counts(self, state, source):
+        """
+        After editing an out-edge of source, recompute the counts level by level,
+        touching only source and the upstream nodes whose lower level changed.
+        """
+        dirty = {source}
+        for depth in range(1, state.max_depth + 1):
+            changed = {node for node in dirty if self._recount(state, node, depth)}
+            dirty = self._upstream(changed) | {source}
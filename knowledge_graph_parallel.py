@@ -0,0 +1,80 @@
+# knowledge_graph_parallel.py
+from concurrent.futures import ProcessPoolExecutor
+
+from knowledge_graph_index import compile_kg
+from knowledge_graph_analysis import reachability
+from knowledge_graph_paths import DEFAULT_SCENARIO_TARGETS, EITHER, direction_sign, iter_signed_paths, _forward_moves
+
+# The compiled graph of this worker process, installed once by _init_worker
+_worker_graph = None
+
+
+def _init_worker(g):
+    global _worker_graph
+    _worker_graph = g
+
+
+def _run_job(job):
+    """Enumerate one partition: (start, target_ids, max_depth, wanted, first, symbolic)."""
+    start, target_ids, max_depth, wanted, first, symbolic = job
+    bound = reachability(_worker_graph).bound(target_ids, wanted)
+    return [
+        (path, signs)
+        for path, signs in iter_signed_paths(_worker_graph, start, target_ids, max_depth, bound, first, symbolic)
+        if signs and (wanted is None or signs[-1] in (wanted, EITHER))
+    ]
+
+
+def path_jobs(kg, source=None, target=None, direction=None, max_depth=8, symbolic=False):
+    """
+    Split an iter_paths query into independent jobs whose results, concatenated
+    in job order, reproduce iter_paths' order exactly.
+    Destination mode gets one job per declared start node (the per-start forward
+    DFS iter_paths runs); source mode gets
+    one job per first hop, in the order the DFS pops them.
+    """
+    g = compile_kg(kg)
+    wanted = direction_sign(direction)
+    if not source and target:
+        desti = g.index.get(target)
+        if desti is None:
+            return []
+        return [(start, {desti}, max_depth, wanted, None, symbolic) for start in range(g.node_count) if start != desti]
+    if not source:
+        return []
+    targets = DEFAULT_SCENARIO_TARGETS if target is None else {target}
+    target_ids = {g.index[t] for t in targets if t in g.index}
+    start = g.index.get(source)
+    if start is None or max_depth < 1:
+        return []
+    on_path = bytearray(len(g))
+    on_path[start] = 1
+    first_moves = _forward_moves(g, start, None, on_path, symbolic)
+    return [(start, target_ids, max_depth, wanted, first, symbolic) for first in reversed(first_moves)]
+
+
+def iter_paths_parallel(kg, source=None, target=None, direction=None, max_depth=8, workers=None, chunksize=1, symbolic=False):
+    """
+    Same results and order as iter_paths (including symbolic=True), enumerated
+    on a pool of worker processes.
+    The compiled graph (with its reachability index) is pickled to each worker
+    once, through the pool initializer, and tasks only carry node indices.
+    Results are merged in job order, so the output is deterministic; each job's
+    paths are yielded as soon as it and every job before it have finished.
+    workers=None uses one process per CPU. On platforms that spawn rather than
+    fork, call this from under an `if __name__ == "__main__":` guard.
+    """
+    g = compile_kg(kg)
+    # Computed here so the workers receive it with the graph
+    reachability(g)
+    jobs = path_jobs(g, source, target, direction, max_depth, symbolic)
+    if not jobs:
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(g,)) as pool:
+        try:
+            for found in pool.map(_run_job, jobs, chunksize=chunksize):
+                for path, signs in found:
+                    yield [g.ids[i] for i in path], signs
+        finally:
+            # Stop queued jobs if the caller abandons the generator early
+            pool.shutdown(wait=True, cancel_futures=True)
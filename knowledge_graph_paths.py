@@ -0,0 +1,865 @@
+# knowledge_graph_paths.py
+import heapq
+import json
+import math
+import time
+from array import array
+from itertools import compress, product
+from knowledge_graph_index import compile_kg, POSITIVE, NEGATIVE, AMBIGUOUS, SIGN_CODES, SIGN_STRINGS
+from knowledge_graph_analysis import condensation, reachability, remaining_hops, _strong_components
+
+# Default endpoints of make_scenario when only a source node is given
+DEFAULT_SCENARIO_TARGETS = {"SPX", "UST"}
+
+# Symbolic net sign of a path that crosses a "+/-" edge: either way, depending
+# on which branch of the last "+/-" edge is taken (see expand_signs)
+EITHER = "+/-"
+
+# PathTrie step codes, indexed by the sign string they stand for
+_STEP_CODES = {"+": 1, "-": 0, EITHER: 2}
+_STEP_SIGNS = ("-", "+", EITHER)
+
+
+class PathResults(list):
+    """
+    A list of traversal results that also records whether a budget cut it short.
+    truncated is None for a complete answer, otherwise the budget that was hit:
+    "time_limit", "max_paths" or "max_depth" (some branch still had edges left
+    when it reached max_depth).
+    """
+
+    def __init__(self, items=(), truncated=None):
+        super().__init__(items)
+        self.truncated = truncated
+
+
+class Deadline:
+    """Wall-clock budget checked cheaply from inner loops (the clock is read every `every` calls)."""
+
+    def __init__(self, time_limit=None, every=256):
+        self.at = None if time_limit is None else time.monotonic() + time_limit
+        self.every = every
+        self.calls = 0
+        self.hit = False
+
+    def expired(self):
+        if self.at is None:
+            return False
+        self.calls += 1
+        if self.calls % self.every == 0 and time.monotonic() >= self.at:
+            self.hit = True
+        return self.hit
+
+
+class PathTrie:
+    """
+    Compact prefix tree of (path, signs) results over a CompiledKG.
+
+    Every entry is one step of a path stored in parallel arrays: the interned node
+    index, the parent entry (-1 for a start node) and one sign code (1 = rising,
+    0 = falling, 2 = either, for symbolic paths; start nodes count as rising). Paths that share a prefix share
+    its entries, so a result set costs a few bytes per distinct step instead of
+    two Python lists per path. Iterating the trie yields the usual
+    (path_ids, signs) pairs, so it can be handed to plot_pyvis_transmission or
+    write_paths like a list; a PathTrie can also be used directly as a
+    parent-pointer arena via push().
+    """
+
+    def __init__(self, kg):
+        self.g = compile_kg(kg)
+        self.nodes = array("l")
+        self.parents = array("l")
+        self.signs = array("b")
+        self.leaves = array("l")
+        self.truncated = None
+        self._last = []  # entries of the most recently added path
+
+    def push(self, parent, node, rising=True):
+        """Append one step below entry parent and return its entry id (rising may also be the code 2, "+/-")."""
+        self.nodes.append(node)
+        self.parents.append(parent)
+        self.signs.append(int(rising))
+        return len(self.nodes) - 1
+
+    def add(self, path, signs):
+        """
+        Add one (path_ids, signs) result. The longest prefix shared with the
+        previously added path is reused, which covers every shared prefix when
+        paths arrive in DFS order, as all the generators here produce them.
+        """
+        index = self.g.index
+        last = self._last
+        k = 0
+        while (k < len(path) and k < len(last)
+               and self.nodes[last[k]] == index[path[k]]
+               and self.signs[last[k]] == (1 if k == 0 else _STEP_CODES[signs[k-1]])):
+            k += 1
+        entries = last[:k]
+        for i in range(k, len(path)):
+            parent = entries[-1] if entries else -1
+            entries.append(self.push(parent, index[path[i]], 1 if i == 0 else _STEP_CODES[signs[i-1]]))
+        self._last = entries
+        self.leaves.append(entries[-1])
+
+    def path_at(self, entry):
+        """Rebuild the (path_ids, signs) pair that ends at entry."""
+        path = []
+        signs = []
+        while entry != -1:
+            path.append(self.g.ids[self.nodes[entry]])
+            signs.append(_STEP_SIGNS[self.signs[entry]])
+            entry = self.parents[entry]
+        path.reverse()
+        signs.reverse()
+        return path, signs[1:]
+
+    def on_path(self, entry, node):
+        """Whether node index node already appears on the path ending at entry."""
+        while entry != -1:
+            if self.nodes[entry] == node:
+                return True
+            entry = self.parents[entry]
+        return False
+
+    def __len__(self):
+        return len(self.leaves)
+
+    def __iter__(self):
+        for leaf in self.leaves:
+            yield self.path_at(leaf)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.path_at(leaf) for leaf in self.leaves[i]]
+        return self.path_at(self.leaves[i])
+
+    def __bool__(self):
+        return len(self.leaves) > 0
+
+    def edge_pairs(self):
+        """Set of (source_id, target_id) steps used by any stored path."""
+        ids = self.g.ids
+        return {(ids[self.nodes[p]], ids[self.nodes[e]])
+                for e, p in enumerate(self.parents) if p != -1}
+
+    def node_ids(self):
+        """Set of node ids on any stored path."""
+        return {self.g.ids[n] for n in set(self.nodes)}
+
+
+def direction_sign(direction):
+    """Map make_scenario's direction ("higher"/"lower"/None) to a net sign ("+"/"-"/None)."""
+    if not direction:
+        return None
+    if direction.lower() == "higher":
+        return "+"
+    if direction.lower() == "lower":
+        return "-"
+    return None
+
+
+def _forward_moves(g, node, sign, on_path, symbolic=False, slot_ok=None):
+    """
+    The (target, sign) moves out of node index node when it is affected with sign
+    (None for the start node), in push order: popping from the end visits them in
+    the same order as the original stack-based DFS.
+    With symbolic=True a "+/-" edge is one move with sign "+/-" instead of two,
+    and a "+/-" effect stays "+/-" across signed edges.
+    slot_ok, if given, holds one byte per out-edge slot; edges with 0 are skipped.
+    """
+    moves = []
+    edges = g.out_edges_of(node)
+    if slot_ok is not None:
+        edges = compress(edges, slot_ok[g.out_offsets[node]:g.out_offsets[node + 1]])
+    for target, edge_sign in edges:
+        if on_path[target]:
+            continue
+        if edge_sign == AMBIGUOUS:
+            if symbolic:
+                moves.append((target, EITHER))
+            else:
+                moves.append((target, "+"))
+                moves.append((target, "-"))
+        elif sign is None or sign == "+":
+            # First edge, or propagate an increase: use edge sign
+            moves.append((target, SIGN_STRINGS[edge_sign]))
+        elif sign == "-":
+            # Propagate a decrease: flip edge sign
+            moves.append((target, "+" if edge_sign == NEGATIVE else "-"))
+        else:
+            moves.append((target, EITHER))
+    return moves
+
+
+def iter_signed_paths(g, start, target_ids, max_depth, bound=None, first=None, symbolic=False, via=None,
+                      blocked=None, slot_ok=None):
+    """
+    Lazily yield (path, signs) for the simple paths from node index start to any
+    node index in target_ids, using the same DFS order as make_scenario.
+    path is a list of node indices; signs[i] is the "+"/"-" effect on path[i+1].
+    "+/-" edges branch into both signs, unless symbolic is set: then every
+    structural path is yielded once, with "+/-" effects from its first "+/-"
+    edge on (see expand_signs).
+    The search backtracks over one shared path instead of copying it at every
+    step; only the yielded paths are fresh lists.
+    bound, if given, is a per-(node, sign) lower bound on the hops still needed
+    (see remaining_hops); moves that cannot finish within max_depth are skipped.
+    first, if given, is the only (target, sign) first move to follow, so the
+    search can be split into one independent job per first hop.
+    via, if given, is a set of node indices every yielded path must pass
+    through; moves from which an unvisited one is unreachable are skipped.
+    blocked (one byte per node, 1 = may not be entered; it is copied, not
+    changed) and slot_ok (one byte per out-edge slot, 0 = may not be used)
+    restrict the graph without rebuilding it (see path_filters).
+    """
+    path = [start]
+    signs = []
+    on_path = bytearray(len(g)) if blocked is None else bytearray(blocked)
+    on_path[start] = 1
+    moves = _forward_moves(g, start, None, on_path, symbolic, slot_ok) if first is None else [first]
+    reach = reachability(g, signed=False) if via else None
+    frames = [moves] if max_depth >= 1 else []
+    while frames:
+        moves = frames[-1]
+        if not moves:
+            frames.pop()
+            if len(path) > 1:
+                on_path[path.pop()] = 0
+                signs.pop()
+            continue
+        target, sign = moves.pop()
+        if bound is not None and bound[2 * target + (sign == "-")] > max_depth - len(path):
+            # A "+/-" effect is live if either of its concrete states is
+            if sign != EITHER or bound[2 * target + 1] > max_depth - len(path):
+                continue
+        if via:
+            bits = reach.reachable_bits(target) | 1 << target
+            if any(not on_path[w] and not bits >> w & 1 for w in via):
+                continue
+        if target in target_ids:
+            if not via or all(on_path[w] or w == target for w in via):
+                yield path + [target], signs + [sign]
+            continue
+        if len(path) + 1 > max_depth:
+            continue
+        path.append(target)
+        signs.append(sign)
+        on_path[target] = 1
+        frames.append(_forward_moves(g, target, sign, on_path, symbolic, slot_ok))
+
+
+def iter_signed_paths_to(g, desti, max_depth, wanted=None):
+    """
+    Yield (key, path, signs) for the simple paths from every declared node to node
+    index desti, using one backward DFS over in-edges instead of a forward search
+    per start node. path holds node indices; key sorts the results into the order
+    the per-start forward DFS would have produced them (start node first, then
+    DFS order), since this generator itself yields in traversal order.
+
+    The net sign of each suffix is propagated in reverse: the product of the edge
+    signs after the last "+/-" edge, which fixes the net effect of any path through
+    that suffix when no "+/-" edge remains. Suffixes whose net effect can never be
+    wanted ("+"/"-") are not expanded into per-node signs.
+    """
+    if max_depth < 1:
+        # Every path has at least one edge; the loop below only checks depth after a yield
+        return
+    # Reversed path (desti first) and the matching out-edge slots, shared by backtracking
+    rpath = [desti]
+    rslots = []
+    on_path = bytearray(len(g))
+    on_path[desti] = 1
+    # Per frame: in-edge positions still to try, suffix product, suffix has "+/-"
+    frames = [(list(range(g.in_offsets[desti], g.in_offsets[desti + 1])), POSITIVE, False)]
+    while frames:
+        pending, product, ambiguous = frames[-1]
+        if not pending:
+            frames.pop()
+            if len(rpath) > 1:
+                on_path[rpath.pop()] = 0
+                rslots.pop()
+            continue
+        k = pending.pop()
+        source = g.in_sources[k]
+        if on_path[source]:
+            continue
+        edge_sign = g.in_signs[k]
+        if ambiguous or edge_sign == AMBIGUOUS:
+            # Only the "+/-" edge closest to desti decides the net effect
+            next_product, next_ambiguous = product, True
+        else:
+            next_product, next_ambiguous = product * edge_sign, False
+        rpath.append(source)
+        rslots.append(g.in_out_slots[k])
+        on_path[source] = 1
+        if source < g.node_count and (next_ambiguous or wanted is None or SIGN_STRINGS[next_product] == wanted):
+            path = rpath[::-1]
+            for signs, steps in _expand_signs(g, rslots[::-1]):
+                if wanted is None or signs[-1] == wanted:
+                    yield (source, steps), path, signs
+        if len(rpath) > max_depth:
+            frames.append(([], next_product, next_ambiguous))
+        else:
+            frames.append((list(range(g.in_offsets[source], g.in_offsets[source + 1])), next_product, next_ambiguous))
+
+
+def _expand_signs(g, slots):
+    """
+    Propagate a rising start node forward along the out-edge slots of one path.
+    Returns (signs, steps) per sign assignment, branching on "+/-" edges;
+    steps is the forward DFS sort key (later slots and "-" branches pop first).
+    """
+    variants = [([], ())]
+    for slot in slots:
+        edge_sign = g.out_signs[slot]
+        nxt = []
+        for signs, steps in variants:
+            if edge_sign == AMBIGUOUS:
+                nxt.append((signs + ["-"], steps + ((-slot, 0),)))
+                nxt.append((signs + ["+"], steps + ((-slot, 1),)))
+            elif not signs or signs[-1] == "+":
+                nxt.append((signs + [SIGN_STRINGS[edge_sign]], steps + ((-slot, 0),)))
+            else:
+                nxt.append((signs + ["+" if edge_sign == NEGATIVE else "-"], steps + ((-slot, 0),)))
+        variants = nxt
+    return variants
+
+
+def _step(counts, edge_sign):
+    """Push a (positive, negative) count pair across one edge."""
+    pos, neg = counts
+    if edge_sign == POSITIVE:
+        return pos, neg
+    if edge_sign == NEGATIVE:
+        return neg, pos
+    # "+/-" sets the sign afresh, so every incoming path continues both ways
+    return pos + neg, pos + neg
+
+
+def _add(frontier, node, pair):
+    old = frontier.get(node)
+    if old is None:
+        frontier[node] = pair
+    else:
+        frontier[node] = (old[0] + pair[0], old[1] + pair[1])
+
+
+def count_paths(kg, source_node=None, desti_node=None, max_depth=8):
+    """
+    Count transmission paths per net sign and per depth without enumerating them.
+    Uses the same modes as make_scenario: with source_node, counts paths to
+    desti_node (or SPX/UST); with only desti_node, counts paths from every node.
+    Runs a dynamic program over (node, sign, depth) states, so the cost is
+    O(max_depth * E) regardless of how many paths exist.
+
+    Each path stops at its first target (and, in source mode, never returns to
+    its start node), but other nodes inside a feedback loop may repeat, so on
+    cyclic graphs the counts are an upper bound on make_scenario's simple-path
+    totals. They are exact whenever no cycle can be entered on the way to the target.
+
+    Returns: {"+": [...], "-": [...]} where counts[sign][d] is the number of
+    paths with d edges and that net sign (index 0 is always 0).
+    """
+    g = compile_kg(kg)
+    counts = {"+": [0] * (max_depth + 1), "-": [0] * (max_depth + 1)}
+
+    if source_node:
+        start = g.index.get(source_node)
+        targets = DEFAULT_SCENARIO_TARGETS if desti_node is None else {desti_node}
+        target_ids = {g.index[t] for t in targets if t in g.index}
+        if start is None:
+            return counts
+        # The empty path behaves like an increase: the first edge sets the sign
+        frontier = {start: (1, 0)}
+        for depth in range(1, max_depth + 1):
+            nxt = {}
+            for node, pair in frontier.items():
+                for target, edge_sign in g.out_edges_of(node):
+                    if target != start:
+                        _add(nxt, target, _step(pair, edge_sign))
+            frontier = {}
+            for node, (pos, neg) in nxt.items():
+                if node in target_ids:
+                    counts["+"][depth] += pos
+                    counts["-"][depth] += neg
+                else:
+                    frontier[node] = (pos, neg)
+    elif desti_node:
+        desti = g.index.get(desti_node)
+        if desti is None:
+            return counts
+        # Walk backwards over in-edges. A pair at node u holds the number of
+        # paths from u to desti_node that end up / down when u starts rising.
+        frontier = {desti: (1, 0)}
+        for depth in range(1, max_depth + 1):
+            nxt = {}
+            for node, pair in frontier.items():
+                for source, edge_sign in g.in_edges_of(node):
+                    if source != desti:
+                        _add(nxt, source, _step(pair, edge_sign))
+            for node, (pos, neg) in nxt.items():
+                # Only declared nodes are start candidates, as in make_scenario
+                if node < g.node_count:
+                    counts["+"][depth] += pos
+                    counts["-"][depth] += neg
+            frontier = nxt
+    return counts
+
+
+def counts_exact(kg, source_node=None, desti_node=None):
+    """
+    Whether count_paths is exact for this query: no feedback loop can be entered
+    on the way from the start node(s) to the target(s). Loops through a target
+    (or, in source mode, back into the start) do not count, since the DP never
+    continues along them. When False, count_paths counts walks and its totals
+    are only an upper bound on the simple paths make_scenario enumerates.
+    """
+    g = compile_kg(kg)
+    starts, target_ids = _endpoints(g, source_node, desti_node)
+    blocked = set(starts) if source_node else set()
+    # The graph the DP walks: no edges out of targets, none back into the start
+    offsets = array("l", [0])
+    targets = array("l")
+    for i in range(len(g)):
+        if i not in target_ids:
+            targets.extend(t for t, _ in g.out_edges_of(i) if t not in blocked)
+        offsets.append(len(targets))
+    found = _strong_components(len(g), offsets, targets)
+    component = array("l", [0] * len(g))
+    for c, members in enumerate(found):
+        for i in members:
+            component[i] = c
+    reached = bytearray(len(found))
+    for start in starts:
+        reached[component[start]] = 1
+    reaches_target = bytearray(len(found))
+    for t in target_ids:
+        reaches_target[component[t]] = 1
+    successors = [set() for _ in found]
+    cyclic = bytearray(len(found))
+    for i in range(len(g)):
+        for slot in range(offsets[i], offsets[i + 1]):
+            c, d = component[i], component[targets[slot]]
+            if c == d:
+                cyclic[c] = 1
+            else:
+                successors[c].add(d)
+    # Components are in topological order: settle reaches_target backwards
+    for c in range(len(found) - 1, -1, -1):
+        if any(reaches_target[d] for d in successors[c]):
+            reaches_target[c] = 1
+    for c in range(len(found)):
+        if reached[c]:
+            if cyclic[c] and reaches_target[c]:
+                return False
+            for d in successors[c]:
+                reached[d] = 1
+    return True
+
+
+def total_paths(counts, direction=None):
+    """Sum a count_paths result, optionally restricted to "higher"/"lower" net effects."""
+    sign = direction_sign(direction)
+    if sign is None:
+        return sum(counts["+"]) + sum(counts["-"])
+    return sum(counts[sign])
+
+
+def iter_paths(kg, source=None, target=None, direction=None, max_depth=8, ordered=True, symbolic=False,
+               components=False):
+    """
+    Lazily yield (path, signs) transmission paths, in the same stable order as
+    make_scenario. path is a list of node ids; signs[i] is the "+"/"-" effect
+    on path[i+1], so signs[-1] is the net effect.
+    With source only, paths end at SPX/UST; with target only, paths start from
+    every other declared node in kg["nodes"] order; with both, source -> target.
+    direction: "higher" or "lower" keeps only paths with that net effect.
+    Nothing is buffered: every query runs one forward search per start node
+    (declared order), so paths stream out as they are found, in make_scenario's
+    order, with memory bounded by the current path. Source queries skip
+    (node, sign) states that cannot reach the targets with a wanted net sign
+    (see reachability); target-only queries prune with exact hop distances
+    (remaining_hops), so moves that cannot reach the target in time are cut at once.
+    ordered=False runs a target-only query as a single backward traversal
+    (iter_signed_paths_to) instead, which is faster but yields in traversal
+    order.
+    symbolic=True yields each structural path once instead of once per branch
+    of its "+/-" edges: signs then run over {"+", "-", "+/-"}, a "+/-" net
+    effect matches either direction, and expand_paths recovers the concrete
+    paths.
+    components=True yields (path, signs, components) instead, where components
+    lists the strongly connected components the path passes through, as in
+    answer_queries (see condensation and feedback_components_of).
+    """
+    g = compile_kg(kg)
+    if components:
+        scc = condensation(g)
+        for path, signs in iter_paths(g, source, target, direction, max_depth, ordered, symbolic):
+            yield path, signs, scc.path_components(path)
+        return
+    wanted = direction_sign(direction)
+    if not source and target and not ordered and not symbolic:
+        desti = g.index.get(target)
+        if desti is None:
+            return
+        for _, path, signs in iter_signed_paths_to(g, desti, max_depth, wanted):
+            yield [g.ids[i] for i in path], signs
+        return
+    starts, target_ids = _endpoints(g, source, target)
+    if not target_ids:
+        return
+    if source:
+        bound = reachability(g).bound(target_ids, wanted)
+    else:
+        bound = remaining_hops(g, target_ids, wanted)
+    for start in starts:
+        for path, signs in iter_signed_paths(g, start, target_ids, max_depth, bound, symbolic=symbolic):
+            if signs and (wanted is None or signs[-1] in (wanted, EITHER)):
+                yield [g.ids[i] for i in path], signs
+
+
+def _as_set(values):
+    """A constraint value as a set; a single string counts as one value, not its characters."""
+    if values is None:
+        return None
+    return {values} if isinstance(values, str) else set(values)
+
+
+def path_filters(kg, target_ids=(), avoid=(), node_types=None, relations=None, edge_signs=None):
+    """
+    The blocked / slot_ok masks of iter_signed_paths for a constrained query.
+    blocked marks the nodes in avoid and, when node_types is given, every node
+    of another type except the target indices (so such nodes can still start a
+    path but never sit inside one). slot_ok clears the out-edge slots whose
+    relation is not in relations or whose sign ("+", "-", "+/-") is not in
+    edge_signs. Each filter may be a collection or a single string.
+    Returns (blocked, slot_ok), each None when nothing is filtered.
+    """
+    g = compile_kg(kg)
+    avoid, node_types, relations, edge_signs = map(_as_set, (avoid, node_types, relations, edge_signs))
+    blocked = None
+    if avoid or node_types is not None:
+        if node_types is None:
+            blocked = bytearray(len(g))
+        else:
+            allowed = [name in node_types for name in g.type_names]
+            blocked = bytearray(not allowed[code] for code in g.type_codes)
+            for t in target_ids:
+                blocked[t] = 0
+        for node_id in avoid:
+            if node_id in g.index:
+                blocked[g.index[node_id]] = 1
+    slot_ok = None
+    if relations is not None or edge_signs is not None:
+        relation_ok = [relations is None or name in relations for name in g.relation_names]
+        sign_ok = {code: edge_signs is None or sign in edge_signs for code, sign in SIGN_STRINGS.items()}
+        slot_ok = bytes(relation_ok[r] and sign_ok[sign] for r, sign in zip(g.out_relations, g.out_signs))
+    return blocked, slot_ok
+
+
+def iter_constrained_paths(kg, source=None, target=None, direction=None, max_depth=8, via=(), avoid=(),
+                           node_types=None, relations=None, edge_signs=None, symbolic=False):
+    """
+    iter_paths with constraints applied while the search runs:
+    via: node ids every path must pass through, in any order;
+    avoid: node ids no path may touch;
+    node_types: node types allowed between a path's start and its target;
+    relations / edge_signs: relations and signs ("+", "-", "+/-") allowed on every edge;
+    direction and symbolic as in iter_paths.
+    Each constraint may be a collection or a single string (one id, type, ...).
+    The filters become per-node and per-edge masks over the compiled graph
+    (path_filters) that the DFS checks as it generates moves, so filtered
+    branches are never entered and nothing is rebuilt. Pruning uses the same
+    bounds as iter_paths on the unfiltered graph, which stay valid under any
+    filter; start nodes that cannot reach a target in time are skipped outright.
+    Paths come out in iter_paths order.
+    """
+    g = compile_kg(kg)
+    wanted = direction_sign(direction)
+    via, avoid = _as_set(via), _as_set(avoid)
+    starts, target_ids = _endpoints(g, source, target)
+    if not target_ids or any(node_id not in g.index for node_id in via):
+        return
+    blocked, slot_ok = path_filters(g, target_ids, avoid, node_types, relations, edge_signs)
+    via_ids = {g.index[node_id] for node_id in via}
+    if source:
+        bound = reachability(g).bound(target_ids, wanted)
+    else:
+        bound = remaining_hops(g, target_ids, wanted)
+    for start in starts:
+        if bound[2 * start] > max_depth or g.ids[start] in avoid:
+            continue
+        if blocked is not None and any(blocked[w] and w != start for w in via_ids):
+            # A via node that cannot be entered can only be the start itself
+            continue
+        for path, signs in iter_signed_paths(g, start, target_ids, max_depth, bound, symbolic=symbolic,
+                                             via=via_ids, blocked=blocked, slot_ok=slot_ok):
+            if signs and (wanted is None or signs[-1] in (wanted, EITHER)):
+                yield [g.ids[i] for i in path], signs
+
+
+def expand_signs(kg, path, signs):
+    """
+    Lazily yield the concrete "+"/"-" sign lists behind one symbolic path from
+    iter_paths(symbolic=True), in the order the branching search finds them
+    ("-" before "+" at each "+/-" edge, earlier edges varying slowest). The
+    edge signs are looked up by (source, target), first matching edge first.
+    """
+    if EITHER not in signs:
+        yield list(signs)
+        return
+    g = compile_kg(kg)
+    edge_signs = [SIGN_CODES[g.edge_sign(a, b)] for a, b in zip(path, path[1:])]
+    for choices in product("-+", repeat=edge_signs.count(AMBIGUOUS)):
+        choices = iter(choices)
+        concrete = []
+        for edge_sign in edge_signs:
+            if edge_sign == AMBIGUOUS:
+                concrete.append(next(choices))
+            elif not concrete or concrete[-1] == "+":
+                concrete.append(SIGN_STRINGS[edge_sign])
+            else:
+                concrete.append("+" if edge_sign == NEGATIVE else "-")
+        yield concrete
+
+
+def expand_paths(kg, paths, direction=None):
+    """
+    Lazily turn symbolic (path, signs) pairs into concrete ones, keeping only
+    the branches with the wanted net direction. Each symbolic path's branches
+    come out together, so the overall order groups them by structural path
+    rather than following the branching search.
+    """
+    g = compile_kg(kg)
+    wanted = direction_sign(direction)
+    for path, signs in paths:
+        for concrete in expand_signs(g, path, signs):
+            if wanted is None or concrete[-1] == wanted:
+                yield path, concrete
+
+
+def format_path(kg, path, signs):
+    """Render a (path, signs) pair as "Label → Label (↑) → ..." the way make_scenario prints it."""
+    g = compile_kg(kg)
+    label_path = [g.label(path[0])]
+    for n, sign in zip(path[1:], signs):
+        arrow = '↑' if sign == '+' else '↑/↓' if sign == EITHER else '↓'
+        label_path.append(f"{g.label(n)} ({arrow})")
+    return " → ".join(label_path)
+
+
+def feedback_components_of(kg, path):
+    """
+    The feedback loops a path of node ids runs through: the member ids of every
+    cyclic strongly connected component it enters, in path order.
+    """
+    scc = condensation(kg)
+    return [scc.member_ids(c) for c in scc.path_components(path) if scc.cyclic[c]]
+
+
+def write_paths(kg, paths, out_fname, fmt=None, total=None):
+    """
+    Stream (path, signs) pairs to out_fname as they are produced, without
+    collecting them first, and return how many were written.
+    fmt "text" writes make_scenario's "Path N: ..." lines plus a "Total paths"
+    trailer (total overrides the written count there; a callable is called once
+    the stream is exhausted); "jsonl" writes one
+    {"path", "signs", "net"} object per line. The default follows the file
+    extension.
+    """
+    g = compile_kg(kg)
+    if fmt is None:
+        fmt = "jsonl" if out_fname.endswith((".jsonl", ".ndjson")) else "text"
+    count = 0
+    with open(out_fname, "w", encoding="utf-8") as f:
+        for path, signs in paths:
+            count += 1
+            if fmt == "jsonl":
+                f.write(json.dumps({"path": path, "signs": signs, "net": signs[-1] if signs else ""}, ensure_ascii=False) + "\n")
+            else:
+                f.write(f"Path {count}: {format_path(g, path, signs)}\n")
+        if fmt != "jsonl":
+            if callable(total):
+                total = total()
+            f.write(f"Total paths: {count if total is None else total}\n")
+    return count
+
+
+def _endpoints(g, source, target):
+    """Start and target node indices for iter_paths-style (source, target) arguments."""
+    if source:
+        starts = [source]
+        targets = DEFAULT_SCENARIO_TARGETS if target is None else {target}
+    elif target:
+        starts = [node_id for node_id in g.ids[:g.node_count] if node_id != target]
+        targets = {target}
+    else:
+        return [], set()
+    start_ids = [g.index[s] for s in starts if s in g.index]
+    target_ids = {g.index[t] for t in targets if t in g.index}
+    return start_ids, target_ids
+
+
+def _state(node, sign):
+    """Slot of a (node index, sign code) state in per-state arrays."""
+    return 2 * node + (0 if sign == POSITIVE else 1)
+
+
+def _remaining_costs(g, target_ids, wanted):
+    """
+    Cheapest (cost, hops) from every (node, sign) state to a target reached with
+    an acceptable net sign, by one reverse Dijkstra over the state graph. Node
+    repeats are allowed, so these are admissible lower bounds for simple paths.
+    """
+    inf = (float("inf"), 0)
+    dist = [inf] * (2 * len(g))
+    heap = []
+    for t in target_ids:
+        for sign in (POSITIVE, NEGATIVE):
+            if wanted is None or SIGN_STRINGS[sign] == wanted:
+                dist[_state(t, sign)] = (0.0, 0)
+                heap.append((0.0, 0, t, sign))
+    heapq.heapify(heap)
+    while heap:
+        cost, hops, node, sign = heapq.heappop(heap)
+        if (cost, hops) > dist[_state(node, sign)]:
+            continue
+        for k in range(g.in_offsets[node], g.in_offsets[node + 1]):
+            source = g.in_sources[k]
+            if source in target_ids:
+                # Targets end a path, so they are never passed through
+                continue
+            edge_sign = g.in_signs[k]
+            step = (cost - math.log(g.in_strengths[k]), hops + 1)
+            prev_signs = (POSITIVE, NEGATIVE) if edge_sign == AMBIGUOUS else (sign * edge_sign,)
+            for prev in prev_signs:
+                if step < dist[_state(source, prev)]:
+                    dist[_state(source, prev)] = step
+                    heapq.heappush(heap, (step[0], step[1], source, prev))
+    return dist
+
+
+def top_k_paths(kg, source=None, target=None, k=10, direction=None, max_depth=8):
+    """
+    Return the k strongest transmission paths (all of them when k is None),
+    strongest first, as (path, signs, strength) tuples; path and signs are as
+    in iter_paths.
+
+    Edges may carry an optional "strength" in (0, 1] (default 1.0) and a path's
+    strength is the product along it, so the search minimises the sum of
+    -log(strength), breaking ties by fewer hops. Paths are ranked with a
+    best-first k-shortest-simple-paths search: partial simple paths are expanded
+    in order of cost so far plus an exact lower bound on the cost still to go
+    (from _remaining_costs over (node, sign) states), so complete paths come off
+    the heap in rank order and the work done tracks k rather than the total
+    number of paths. The net direction ("higher"/"lower") is enforced inside the
+    search, and source/target/max_depth follow iter_paths.
+    """
+    g = compile_kg(kg)
+    starts, target_ids = _endpoints(g, source, target)
+    wanted = direction_sign(direction)
+    remaining = _remaining_costs(g, target_ids, wanted)
+    arena = PathTrie(g)
+    heap = []
+    seq = 0
+    for start in starts:
+        cost, hops = remaining[_state(start, POSITIVE)]
+        if cost < float("inf"):
+            # (estimated cost, estimated hops, tie-break, cost, hops, entry, sign, complete)
+            heap.append((cost, hops, seq, 0.0, 0, arena.push(-1, start), POSITIVE, False))
+            seq += 1
+    heapq.heapify(heap)
+    results = []
+    while heap and (k is None or len(results) < k):
+        _, _, _, cost, hops, entry, sign, complete = heapq.heappop(heap)
+        if complete:
+            path, signs = arena.path_at(entry)
+            results.append((path, signs, math.exp(-cost)))
+            continue
+        if hops >= max_depth:
+            continue
+        node = arena.nodes[entry]
+        for slot in range(g.out_offsets[node], g.out_offsets[node + 1]):
+            target_node = g.out_targets[slot]
+            if arena.on_path(entry, target_node):
+                continue
+            edge_sign = g.out_signs[slot]
+            step_cost = cost - math.log(g.out_strengths[slot])
+            next_signs = (POSITIVE, NEGATIVE) if edge_sign == AMBIGUOUS else (sign * edge_sign,)
+            for next_sign in next_signs:
+                if target_node in target_ids:
+                    if wanted is not None and SIGN_STRINGS[next_sign] != wanted:
+                        continue
+                    estimate, done = (0.0, 0), True
+                else:
+                    estimate = remaining[_state(target_node, next_sign)]
+                    done = False
+                    if estimate[0] == float("inf"):
+                        continue
+                child = arena.push(entry, target_node, next_sign == POSITIVE)
+                heapq.heappush(heap, (step_cost + estimate[0], hops + 1 + estimate[1], seq,
+                                      step_cost, hops + 1, child, next_sign, done))
+                seq += 1
+    return results
+
+
+def answer_queries(kg, queries, max_depth=8, topk=None):
+    """
+    Answer many (source, target, direction) path questions against one graph in
+    a single call. Each query follows iter_paths: source or target may be None,
+    and direction is "higher", "lower" or None.
+
+    Work is shared across the batch: queries are grouped by (source, target) so
+    each pair is enumerated once and split by direction afterwards; target-only
+    queries reuse one backward traversal per target; and forward searches toward
+    the same target set share one memoized remaining_hops table, which prunes
+    every branch that can no longer reach the target with a wanted net sign.
+
+    Returns a list aligned with queries of
+    {"source", "target", "direction", "paths", "total", "components"} dicts,
+    where paths holds the first topk (path, signs) pairs in iter_paths order (all
+    when topk is None), total counts every matching path, and components[i] lists
+    the strongly connected components paths[i] passes through (see condensation).
+    """
+    g = compile_kg(kg)
+    scc = condensation(g)
+    wanted_by_pair = {}
+    for source, target, direction in queries:
+        wanted_by_pair.setdefault((source, target), set()).add(direction_sign(direction))
+
+    bounds = {}
+    found = {}
+    for (source, target), wanted_set in wanted_by_pair.items():
+        # One enumeration per pair; only narrow it when a single direction is asked for
+        shared = next(iter(wanted_set)) if len(wanted_set) == 1 else None
+        if not source and target:
+            desti = g.index.get(target)
+            items = [] if desti is None else sorted(iter_signed_paths_to(g, desti, max_depth, shared), key=lambda item: item[0])
+            found[(source, target)] = [(path, signs) for _, path, signs in items]
+            continue
+        starts, target_ids = _endpoints(g, source, target)
+        key = (frozenset(target_ids), shared)
+        if key not in bounds:
+            bounds[key] = remaining_hops(g, target_ids, shared)
+        found[(source, target)] = [
+            (path, signs) for start in starts
+            for path, signs in iter_signed_paths(g, start, target_ids, max_depth, bounds[key])
+            if signs
+        ]
+
+    answers = []
+    for source, target, direction in queries:
+        wanted = direction_sign(direction)
+        matching = [(path, signs) for path, signs in found[(source, target)]
+                    if wanted is None or signs[-1] == wanted]
+        shown = matching if topk is None else matching[:topk]
+        paths = [([g.ids[i] for i in path], signs) for path, signs in shown]
+        answers.append({
+            "source": source,
+            "target": target,
+            "direction": direction,
+            "paths": paths,
+            "total": len(matching),
+            "components": [scc.path_components(path) for path, _ in paths],
+        })
+    return answers
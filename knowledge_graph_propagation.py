@@ -0,0 +1,335 @@
+# knowledge_graph_propagation.py
+from knowledge_graph_index import compile_kg, AMBIGUOUS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Graphs up to this many nodes are propagated with a dense matrix product
+DENSE_NODE_LIMIT = 2000
+
+
+class PropagationResult:
+    """
+    Per-node net impact of a batch of scenarios.
+    impacts is an (n_nodes, n_scenarios) array whose rows follow node_ids and
+    whose columns follow scenario_names.
+    """
+
+    def __init__(self, node_ids, scenario_names, impacts):
+        self.node_ids = node_ids
+        self.scenario_names = scenario_names
+        self.impacts = impacts
+        self._rows = {node_id: i for i, node_id in enumerate(node_ids)}
+
+    def for_scenario(self, name, tol=1e-12):
+        """Return {node_id: impact} for one scenario, leaving out nodes it does not move."""
+        column = self.impacts[:, self.scenario_names.index(name)]
+        return {self.node_ids[i]: float(column[i]) for i in np.flatnonzero(np.abs(column) > tol)}
+
+    def for_node(self, node_id):
+        """Return {scenario_name: impact} for one node."""
+        row = self.impacts[self._rows[node_id]]
+        return dict(zip(self.scenario_names, row.tolist()))
+
+    def top_nodes(self, name, k=10):
+        """The k nodes with the largest absolute impact under one scenario, as (node_id, impact)."""
+        column = self.impacts[:, self.scenario_names.index(name)]
+        order = np.argsort(-np.abs(column), kind="stable")[:k]
+        return [(self.node_ids[i], float(column[i])) for i in order if column[i] != 0]
+
+    def describe(self):
+        return {name: self.for_scenario(name) for name in self.scenario_names}
+
+
+def edge_weights(kg, ambiguous=0.0, transpose=False):
+    """
+    Signed weight of every in-CSR edge slot of the compiled graph (out-CSR slots
+    with transpose=True): sign (+1/-1) times the edge's "strength", with "+/-"
+    edges given `ambiguous` (0.0 treats them as an even coin flip whose expected
+    effect cancels out).
+    """
+    g = compile_kg(kg)
+    signs = np.asarray(g.out_signs if transpose else g.in_signs).astype(float)
+    strengths = np.asarray(g.out_strengths if transpose else g.in_strengths)
+    weights = signs * strengths
+    is_ambiguous = signs == AMBIGUOUS
+    weights[is_ambiguous] = ambiguous * strengths[is_ambiguous]
+    return weights
+
+
+def signed_matrix(kg, ambiguous=0.0):
+    """
+    Dense signed adjacency matrix A with A[target, source] = signed weight, so
+    A @ x moves a vector of node shocks one hop along the edges. Parallel edges add up.
+    """
+    if np is None:
+        print("numpy is required for this function. Install with 'pip install numpy'.")
+        return
+    g = compile_kg(kg)
+    n = len(g)
+    matrix = np.zeros((n, n))
+    targets = np.repeat(np.arange(n), np.diff(np.asarray(g.in_offsets)))
+    sources = np.asarray(g.in_sources)
+    np.add.at(matrix, (targets, sources), edge_weights(g, ambiguous))
+    return matrix
+
+
+def shock_matrix(kg, scenarios):
+    """
+    Stack the shocks of several Scenario objects into an (n_nodes, n_scenarios)
+    array, one column per scenario. Shocks on ids that are not in the graph are
+    reported and skipped.
+    """
+    g = compile_kg(kg)
+    shocks = np.zeros((len(g), len(scenarios)))
+    for j, scenario in enumerate(scenarios):
+        for node_id, size in scenario.shocks.items():
+            i = g.index.get(node_id)
+            if i is None:
+                print(f"Scenario '{scenario.name}': unknown node '{node_id}' ignored.")
+                continue
+            shocks[i, j] += size
+    return shocks
+
+
+def propagate_scenarios(kg, scenarios, max_depth=8, decay=1.0, ambiguous=0.0, dense=None):
+    """
+    Push the shocks of many Scenario objects through the signed KG at once.
+    Each scenario is one column of a shock matrix X; the net impact is
+        X + decay * A X + decay^2 * A^2 X + ... (max_depth hops),
+    where A is the signed, strength-weighted adjacency matrix (see edge_weights
+    for how "+/-" edges are treated). Every hop is a single matrix product for the
+    whole batch: a dense BLAS product on small graphs, or a segmented sum over the
+    in-edge CSR arrays of the compiled graph on large ones (dense=None picks by size).
+    Feedback loops are walked like any other edge, so impacts can reinforce or
+    offset themselves within max_depth hops.
+    Returns: PropagationResult.
+    """
+    if np is None:
+        print("numpy is required for this function. Install with 'pip install numpy'.")
+        return
+    g = compile_kg(kg)
+    x = shock_matrix(g, scenarios)
+    total = x.copy()
+    if dense is None:
+        dense = len(g) <= DENSE_NODE_LIMIT
+    if dense:
+        matrix = signed_matrix(g, ambiguous)
+        step = lambda v: matrix @ v
+    else:
+        step = _sparse_step(g, edge_weights(g, ambiguous))
+    for _ in range(max_depth):
+        x = decay * step(x)
+        if not x.any():
+            break
+        total += x
+    return PropagationResult(list(g.ids), [s.name for s in scenarios], total)
+
+
+def _sparse_step(g, weights, transpose=False):
+    """
+    One-hop propagation over the in-edge CSR arrays: every node sums its weighted
+    in-edges with a single np.add.reduceat per hop. weights holds one value per
+    in-edge slot, or one column per batch column when edges vary between columns.
+    transpose=True applies A^T instead: every node sums its weighted out-edges
+    (weights per out-edge slot), which moves influence one hop backwards.
+    """
+    offsets = np.asarray(g.out_offsets if transpose else g.in_offsets)
+    sources = np.asarray(g.out_targets if transpose else g.in_sources)
+    has_inputs = np.flatnonzero(np.diff(offsets))
+    starts = offsets[has_inputs]
+    if weights.ndim == 1:
+        weights = weights[:, None]
+
+    def step(x):
+        out = np.zeros_like(x)
+        if len(sources):
+            out[has_inputs] = np.add.reduceat(weights * x[sources], starts, axis=0)
+        return out
+    return step
+
+
+def channel_attribution(kg, instrument, targets, channels=None, max_depth=8, decay=1.0, ambiguous=0.0, dense=None):
+    """
+    Split the signed influence of a unit shock to instrument on each target into
+    one share per transmission channel.
+
+    The influence is the impact propagate_scenarios reports for that shock, and
+    it decomposes exactly over the instrument's first-hop edges: an edge of
+    weight w into node v contributes decay * w * R[v, t], where R[v, t] is the
+    influence of v on target t within max_depth - 1 hops (1 for v == t). R is
+    filled for every target at once by backward sweeps over the out-edges
+    (A^T, dense or sparse as in propagate_scenarios), so no path is enumerated.
+
+    channels: {name: [first-hop node ids]}, or a list of names that are node ids
+    themselves; by default every first-hop node is its own channel. A node listed
+    under several channels counts for the first, and first-hop edges outside
+    every channel are reported as "other".
+    Returns: {target_id: {"total", "channels", "shares"}} where channels maps each
+    channel to its influence (summing to total) and shares to influence / total
+    (None when the total is 0). Unknown ids are reported and skipped.
+    """
+    if np is None:
+        print("numpy is required for this function. Install with 'pip install numpy'.")
+        return
+    g = compile_kg(kg)
+    source = g.index.get(instrument)
+    if source is None:
+        print(f"Unknown instrument '{instrument}'.")
+        return {}
+    target_ids = []
+    for node_id in targets:
+        if node_id in g.index:
+            target_ids.append(g.index[node_id])
+        else:
+            print(f"Unknown target '{node_id}' ignored.")
+    lo, hi = g.out_offsets[source], g.out_offsets[source + 1]
+    first_hops = np.asarray(g.out_targets[lo:hi], dtype=np.int64)
+    if channels is None:
+        channels = {g.ids[v]: [g.ids[v]] for v in first_hops}
+    elif not isinstance(channels, dict):
+        channels = {name: [name] for name in channels}
+    channel_of = {}
+    for name, node_ids in channels.items():
+        for node_id in node_ids:
+            if node_id in g.index:
+                channel_of.setdefault(g.index[node_id], name)
+
+    # reach[v, j]: influence of a unit shock at v on target_ids[j]
+    y = np.zeros((len(g), len(target_ids)))
+    y[target_ids, np.arange(len(target_ids))] = 1.0
+    reach = y.copy()
+    if dense is None:
+        dense = len(g) <= DENSE_NODE_LIMIT
+    if dense:
+        matrix = signed_matrix(g, ambiguous).T
+        step = lambda v: matrix @ v
+    else:
+        step = _sparse_step(g, edge_weights(g, ambiguous, transpose=True), transpose=True)
+    for _ in range(max_depth - 1):
+        y = decay * step(y)
+        if not y.any():
+            break
+        reach += y
+    weights = edge_weights(g, ambiguous, transpose=True)[lo:hi]
+    if max_depth < 1:
+        weights = np.zeros_like(weights)
+    # One row per first-hop edge
+    contributions = decay * weights[:, None] * reach[first_hops]
+
+    by_channel = {name: np.zeros(len(target_ids)) for name in channels}
+    other = np.zeros(len(target_ids))
+    for k, v in enumerate(first_hops):
+        name = channel_of.get(int(v))
+        if name is None:
+            other += contributions[k]
+        else:
+            by_channel[name] += contributions[k]
+    if other.any():
+        by_channel["other"] = other
+
+    result = {}
+    for j, t in enumerate(target_ids):
+        total = float(contributions[:, j].sum())
+        influence = {name: float(values[j]) for name, values in by_channel.items()}
+        result[g.ids[t]] = {
+            "total": total,
+            "channels": influence,
+            "shares": {name: (value / total if total else None) for name, value in influence.items()},
+        }
+    return result
+
+
+def ambiguous_probabilities(kg, p_positive=0.5):
+    """
+    Probability that each ambiguous ("+/-") in-edge slot acts as "+".
+    Uses, in order: p_positive[(source_id, target_id)] when p_positive is a dict,
+    the edge's own optional "p_positive" field, then 0.5 (or p_positive itself
+    when it is a number).
+    Returns (slots, probabilities) as arrays.
+    """
+    g = compile_kg(kg)
+    signs = np.asarray(g.in_signs)
+    slots = np.flatnonzero(signs == AMBIGUOUS)
+    default = 0.5 if isinstance(p_positive, dict) else p_positive
+    overrides = p_positive if isinstance(p_positive, dict) else {}
+    probabilities = np.empty(len(slots))
+    for i, slot in enumerate(slots):
+        e = g.in_edges[slot]
+        key = (g.ids[g.edge_sources[e]], g.ids[g.edge_targets[e]])
+        probabilities[i] = overrides.get(key, g.edge_attr(e, "p_positive", default))
+    return slots, probabilities
+
+
+def simulate_ambiguous(kg, scenario, n_samples=20000, p_positive=0.5, max_depth=8, decay=1.0,
+                       nodes=None, seed=None, batch_size=4096, tol=1e-12):
+    """
+    Monte Carlo resolution of "+/-" edges for one Scenario.
+    Instead of branching on every ambiguous edge, each sample draws a concrete
+    sign for all of them at once (positive with the probability given by
+    ambiguous_probabilities) and propagates the scenario's shocks as in
+    propagate_scenarios. Samples are run in vectorized batches of batch_size
+    columns, with a numpy Generator seeded by seed so runs with the same seed and
+    batch_size are reproducible.
+    nodes limits the report to those ids (default: every node the shocks can move);
+    unknown ids are reported and skipped.
+    Returns: {node_id: {"up", "down", "flat", "mean", "std"}} where up/down/flat
+    are the probabilities of a positive, negative or (|impact| <= tol) zero net effect.
+    """
+    if np is None:
+        print("numpy is required for this function. Install with 'pip install numpy'.")
+        return
+    g = compile_kg(kg)
+    if nodes is not None:
+        for node_id in nodes:
+            if node_id not in g.index:
+                print(f"Unknown node '{node_id}' ignored.")
+        nodes = [node_id for node_id in nodes if node_id in g.index]
+    rng = np.random.default_rng(seed)
+    shock = shock_matrix(g, [scenario])
+    base = edge_weights(g, 0.0)
+    strengths = np.asarray(g.in_strengths)
+    slots, probabilities = ambiguous_probabilities(g, p_positive)
+
+    up = np.zeros(len(g))
+    down = np.zeros(len(g))
+    total = np.zeros(len(g))
+    total_sq = np.zeros(len(g))
+    done = 0
+    while done < n_samples:
+        batch = min(batch_size, n_samples - done)
+        weights = np.repeat(base[:, None], batch, axis=1)
+        draws = rng.random((len(slots), batch)) < probabilities[:, None]
+        weights[slots] = np.where(draws, 1.0, -1.0) * strengths[slots, None]
+        step = _sparse_step(g, weights)
+        x = np.repeat(shock, batch, axis=1)
+        impact = x.copy()
+        for _ in range(max_depth):
+            x = decay * step(x)
+            if not x.any():
+                break
+            impact += x
+        up += (impact > tol).sum(axis=1)
+        down += (impact < -tol).sum(axis=1)
+        total += impact.sum(axis=1)
+        total_sq += (impact * impact).sum(axis=1)
+        done += batch
+
+    mean = total / n_samples
+    std = np.sqrt(np.maximum(total_sq / n_samples - mean * mean, 0.0))
+    if nodes is None:
+        rows = np.flatnonzero((up + down) > 0)
+    else:
+        rows = [g.index[node_id] for node_id in nodes]
+    return {
+        g.ids[i]: {
+            "up": float(up[i] / n_samples),
+            "down": float(down[i] / n_samples),
+            "flat": float(1.0 - (up[i] + down[i]) / n_samples),
+            "mean": float(mean[i]),
+            "std": float(std[i]),
+        }
+        for i in rows
+    }
@@ -40,31 +40,36 @@ sample_kg = {
         
     ],
     "edges": [
+        # Edges may also carry an optional "strength" in (0, 1] used to rank transmission
+        # channels (see top_k_paths); edges without one count as full strength (1.0).
+        # An optional "lag" (in quarters, default 0) delays an edge's effect in
+        # time-stepped simulations (see knowledge_graph_simulation).
+
         # Central Bank Chain
         {"source": "the_fed", "target": "policy_rate", "relation": "sets", "sign": "+/-"},
 
         # Policy rate affects yield curve, credit, exchange rate, SPX, UST, inflation_expectations
         {"source": "policy_rate", "target": "yield_curve", "relation": "affects", "sign": "+"},
-        {"source": "policy_rate", "target": "credit", "relation": "affects", "sign": "-"},
+        {"source": "policy_rate", "target": "credit", "relation": "affects", "sign": "-", "lag": 1},
         {"source": "policy_rate", "target": "exchange_rate", "relation": "affects", "sign": "+"},
         {"source": "policy_rate", "target": "SPX", "relation": "affects", "sign": "-"},
         {"source": "policy_rate", "target": "UST", "relation": "affects", "sign": "+"},
-        {"source": "policy_rate", "target": "inflation_expectations", "relation": "affects", "sign": "-"},
+        {"source": "policy_rate", "target": "inflation_expectations", "relation": "affects", "sign": "-", "lag": 1},
         # Yield curve affects UST
         {"source": "yield_curve", "target": "UST", "relation": "affects", "sign": "+"},
-        {"source": "credit", "target": "gdp", "relation": "affects", "sign": "+"},
+        {"source": "credit", "target": "gdp", "relation": "affects", "sign": "+", "lag": 2},
         
         # Exchange rate affects imported_prices
-        {"source": "exchange_rate", "target": "imported_prices", "relation": "affects", "sign": "-"},
+        {"source": "exchange_rate", "target": "imported_prices", "relation": "affects", "sign": "-", "lag": 1},
         # GDP affects CPI
-        {"source": "gdp", "target": "domestic_prices", "relation": "affects", "sign": "+"},
+        {"source": "gdp", "target": "domestic_prices", "relation": "affects", "sign": "+", "lag": 2},
         # Imported and domestic goods prices affect aggregate prices
         {"source": "imported_prices", "target": "cpi", "relation": "affects", "sign": "+"},
         {"source": "domestic_prices", "target": "cpi", "relation": "affects", "sign": "+"},
         # Exchange rate, inflation_expectations, gdp also affect CPI
 
         {"source": "inflation_expectations", "target": "cpi", "relation": "affects", "sign": "+"},
-        {"source": "gdp", "target": "cpi", "relation": "affects", "sign": "+"},
+        {"source": "gdp", "target": "cpi", "relation": "affects", "sign": "+", "lag": 2},
         # inflation measured by CPI
         {"source": "cpi", "target": "inflation", "relation": "measures", "sign": "+"},
         {"source": "inflation", "target": "the_fed", "relation": "affects", "sign": "+/-"},
@@ -80,11 +85,11 @@ sample_kg = {
         {"source": "monetary_policy", "target": "liquidity", "relation": "affects", "sign": "+/-", "description": "Central bank can either inject or withdraw liquidity into the economy"},
         {"source": "monetary_policy", "target": "policy_rate", "relation": "sets", "sign": "+/-"},
         {"source": "liquidity", "target": "borrowing_spending", "relation": "increases", "sign": "+"},
-        {"source": "policy_rate", "target": "borrowing_spending", "relation": "increases", "sign": "-"},
+        {"source": "policy_rate", "target": "borrowing_spending", "relation": "increases", "sign": "-", "lag": 1},
         
         
         # --- Demand-Supply Imbalance Chain ---
-        {"source": "borrowing_spending", "target": "demand", "relation": "increases", "sign": "+"},
+        {"source": "borrowing_spending", "target": "demand", "relation": "increases", "sign": "+", "lag": 1},
         {"source": "demand", "target": "supply_demand_imbalance", "relation": "heightens_imbalance", "sign": "+"},
         {"source": "supply", "target": "supply_demand_imbalance", "relation": "strains_imbalance", "sign": "-"},
         {"source": "supply_demand_imbalance", "target": "inflation", "relation": "increases_risk", "sign": "+"},
@@ -117,4 +122,52 @@ sample_kg = {
         {"source": "the_fed", "target": "UST", "relation": "trades", "sign": "+", "description": "The Federal Reserve trades US Treasuries (UST) to inject or withdraw liquidity"},
         {"source": "the_fed", "target": "liquidity", "relation": "affects", "sign": "+/-", "description": "The Federal Reserve's actions affect liquidity in the financial system"},
     ]
-} 
\ No newline at end of file
+} 
+# Ids in data/knowledge_graph_v2_fixed.json that name a sample_kg node; the
+# unified loader (knowledge_graph_merge.load_unified_kg) merges them into it.
+section_aliases = {
+    "policy_interest_rate": "policy_rate",
+    "interest_rates": "policy_rate",
+    "economic_growth": "gdp",
+}
+
+# Signed edges that connect sample_kg to the JSON sections. A link replaces a
+# section edge between the same two nodes, so it can also sign that edge; the
+# valuation (DCF) chain is signed here, since section edges carry no sign.
+section_links = [
+    {"source": "policy_rate", "target": "risk_free_rate", "relation": "affects", "sign": "+"},
+    {"source": "policy_rate", "target": "cost_of_debt", "relation": "affects", "sign": "+"},
+    # Cost of capital
+    {"source": "risk_free_rate", "target": "capm", "relation": "feeds", "sign": "+"},
+    {"source": "beta", "target": "capm", "relation": "feeds", "sign": "+"},
+    {"source": "market_risk_premium", "target": "capm", "relation": "feeds", "sign": "+"},
+    {"source": "capm", "target": "cost_of_equity", "relation": "calculates", "sign": "+"},
+    {"source": "cost_of_equity", "target": "wacc", "relation": "feeds", "sign": "+"},
+    {"source": "cost_of_debt", "target": "wacc", "relation": "feeds", "sign": "+"},
+    {"source": "wacc", "target": "discount_rate", "relation": "sets", "sign": "+"},
+    # Discounting: a higher discount rate lowers every discounted value
+    {"source": "discount_rate", "target": "dcf", "relation": "discounts", "sign": "-"},
+    {"source": "discount_rate", "target": "present_value", "relation": "discounts", "sign": "-"},
+    {"source": "ufcf", "target": "dcf", "relation": "feeds", "sign": "+"},
+    {"source": "ufcf", "target": "present_value", "relation": "feeds", "sign": "+"},
+    {"source": "dcf", "target": "terminal_value", "relation": "calculates", "sign": "+"},
+    {"source": "dcf", "target": "present_value", "relation": "calculates", "sign": "+"},
+    {"source": "dcf", "target": "enterprise_value", "relation": "calculates", "sign": "+"},
+    {"source": "terminal_value", "target": "present_value", "relation": "feeds", "sign": "+"},
+    {"source": "present_value", "target": "enterprise_value", "relation": "sum_of", "sign": "+"},
+    {"source": "enterprise_value", "target": "equity_value", "relation": "leads_to", "sign": "+"},
+    {"source": "net_debt", "target": "equity_value", "relation": "derived_by_subtracting", "sign": "-"},
+    {"source": "equity_value", "target": "implied_share_price", "relation": "leads_to", "sign": "+"},
+    {"source": "shares_outstanding", "target": "implied_share_price", "relation": "divides", "sign": "-"},
+    {"source": "implied_share_price", "target": "SPX", "relation": "aggregates_into", "sign": "+"},
+]
+
+# First-hop nodes through which each MonetaryPolicy channel leaves the policy
+# rate (see MonetaryPolicy.attribute and channel_attribution)
+policy_channels = {
+    "interest_rate": ["yield_curve", "UST", "borrowing_spending", "debt_servicing_costs", "risk_free_rate", "cost_of_debt"],
+    "exchange_rate": ["exchange_rate"],
+    "credit": ["credit"],
+    "asset_price": ["SPX"],
+    "expectations": ["inflation_expectations"],
+}
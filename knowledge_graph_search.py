@@ -0,0 +1,177 @@
+# knowledge_graph_search.py
+import math
+import re
+from bisect import bisect_left
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+from knowledge_graph_index import compile_kg
+
+# Words are runs of letters/digits; "&" joins them so "S&P" stays one token
+_TOKEN = re.compile(r"[a-z0-9]+(?:&[a-z0-9]+)*")
+
+# Words that never start or end a node mention on their own
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "if", "in", "is", "it",
+    "of", "on", "or", "the", "to", "was", "what", "when", "which", "will", "with", "would",
+}
+
+# Weight of a query token matching a node token exactly, by prefix, or fuzzily
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.8
+FUZZY_MATCH = 0.7
+
+
+def tokenize(text):
+    """Lower-case word tokens of a label, id or query ("inflation_expectations" -> 2 tokens)."""
+    return _TOKEN.findall(text.lower().replace("_", " "))
+
+
+def _trigrams(token):
+    padded = f"^{token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NodeSearchIndex:
+    """
+    In-memory search over node ids, labels and aliases, for turning free text
+    ("inflation expectations", "S&P") into node ids.
+
+    Every name of a node (its id, its label, each alias) is tokenized into a token
+    inverted index. A query token matches index tokens exactly, as a prefix
+    (bisect over the sorted vocabulary) or fuzzily (candidates sharing a trigram,
+    ranked by difflib similarity), and each match adds its IDF-weighted score to
+    the nodes holding that token. A query equal to a full name scores highest.
+    Aliases come from a node's optional "aliases" list plus the aliases argument
+    ({phrase: node_id}).
+    The last memo_size distinct queries are memoized, least recently used first out.
+    """
+
+    def __init__(self, kg, aliases=None, max_expansions=50, fuzzy_cutoff=0.75, memo_size=1024):
+        g = compile_kg(kg)
+        self.g = g
+        self.max_expansions = max_expansions
+        self.memo_size = memo_size
+        self.fuzzy_cutoff = fuzzy_cutoff
+        names = [[node_id, g.labels[i]] for i, node_id in enumerate(g.ids)]
+        for node in g["nodes"]:
+            names[g.index[node["id"]]].extend(node.get("aliases", ()))
+        for phrase, node_id in (aliases or {}).items():
+            if node_id in g.index:
+                names[g.index[node_id]].append(phrase)
+
+        self.postings = {}
+        self.full_names = {}
+        # Shortest name length per node, so equal scores favour the more specific node
+        self.lengths = [min(len(tokenize(name)) for name in node_names) for node_names in names]
+        for i, node_names in enumerate(names):
+            for name in node_names:
+                tokens = tokenize(name)
+                self.full_names.setdefault(" ".join(tokens), set()).add(i)
+                for token in tokens:
+                    self.postings.setdefault(token, set()).add(i)
+        self.vocabulary = sorted(self.postings)
+        self.idf = {token: math.log(1 + len(g) / len(nodes)) for token, nodes in self.postings.items()}
+        self.grams = {}
+        for token in self.vocabulary:
+            for gram in _trigrams(token):
+                self.grams.setdefault(gram, []).append(token)
+        self._memo = OrderedDict()
+
+    def _matches(self, token):
+        """(index token, match weight) pairs for one query token."""
+        if token in self.postings:
+            found = {token: EXACT_MATCH}
+        else:
+            found = {}
+        lo = bisect_left(self.vocabulary, token)
+        for other in self.vocabulary[lo:lo + self.max_expansions]:
+            if not other.startswith(token):
+                break
+            found.setdefault(other, PREFIX_MATCH)
+        if not found and len(token) >= 4:
+            shared = {}
+            for gram in _trigrams(token):
+                for other in self.grams.get(gram, ()):
+                    shared[other] = shared.get(other, 0) + 1
+            candidates = sorted(shared, key=shared.get, reverse=True)[:self.max_expansions]
+            for other in candidates:
+                similarity = SequenceMatcher(None, token, other).ratio()
+                if similarity >= self.fuzzy_cutoff:
+                    found[other] = FUZZY_MATCH * similarity
+        return found
+
+    def search(self, phrase, k=5, min_score=0.3):
+        """Rank node ids for phrase; returns up to k (node_id, score) pairs, best first."""
+        tokens = tokenize(phrase)
+        key = (" ".join(tokens), k, min_score)
+        if key in self._memo:
+            self._memo.move_to_end(key)
+            return self._memo[key]
+        scores = {}
+        total = 0.0
+        for token in tokens:
+            best = {}
+            weight = 0.0
+            for other, match in self._matches(token).items():
+                idf = self.idf[other]
+                weight = max(weight, idf)
+                for i in self.postings[other]:
+                    best[i] = max(best.get(i, 0.0), match * idf)
+            # Unknown words still count against the score, at an average weight
+            total += weight or math.log(1 + len(self.g))
+            for i, score in best.items():
+                scores[i] = scores.get(i, 0.0) + score
+        results = []
+        if total:
+            exact = self.full_names.get(key[0], ())
+            for i, score in scores.items():
+                score = score / total + (1.0 if i in exact else 0.0)
+                if score >= min_score:
+                    results.append((score, i))
+        results.sort(key=lambda item: (-item[0], self.lengths[item[1]], item[1]))
+        ranked = [(self.g.ids[i], round(score, 4)) for score, i in results[:k]]
+        self._memo[key] = ranked
+        if len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+        return ranked
+
+    def resolve(self, phrase, min_score=0.5):
+        """Best node id for phrase, or None when nothing scores at least min_score."""
+        ranked = self.search(phrase, k=1, min_score=min_score)
+        return ranked[0][0] if ranked else None
+
+    def resolve_many(self, phrases, k=1, min_score=0.5):
+        """{phrase: [(node_id, score), ...]} for a batch of phrases, sharing the index and memo."""
+        return {phrase: self.search(phrase, k, min_score) for phrase in phrases}
+
+    def mentions(self, text, max_words=4, min_score=0.8, limit=None):
+        """
+        Node ids mentioned in free text such as a user query, in order of
+        appearance. Word windows are tried longest first and each word is used by
+        at most one mention; windows that start or end on a stopword are skipped.
+        """
+        words = tokenize(text)
+        used = [False] * len(words)
+        found = []
+        for size in range(min(max_words, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                window = words[start:start + size]
+                if any(used[start:start + size]) or window[0] in STOPWORDS or window[-1] in STOPWORDS:
+                    continue
+                ranked = self.search(" ".join(window), k=1, min_score=min_score)
+                if ranked and all(node_id != ranked[0][0] for _, node_id in found):
+                    found.append((start, ranked[0][0]))
+                    used[start:start + size] = [True] * size
+        ids = [node_id for _, node_id in sorted(found)]
+        return ids if limit is None else ids[:limit]
+
+
+def search_index(kg, aliases=None):
+    """NodeSearchIndex for kg, built once per compiled graph (a new one when aliases are given)."""
+    g = compile_kg(kg)
+    if aliases is not None:
+        return NodeSearchIndex(g, aliases)
+    if "search_index" not in g.derived:
+        g.derived["search_index"] = NodeSearchIndex(g)
+    return g.derived["search_index"]
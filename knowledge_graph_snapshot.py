@@ -0,0 +1,148 @@
+# knowledge_graph_snapshot.py
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from knowledge_graph_index import CompiledKG, compile_kg, _NODE_COLUMNS, _EDGE_COLUMNS
+from knowledge_graph_cache import graph_fingerprint
+
+SNAPSHOT_MAGIC = b"KGSNAP\0\0"
+# Bump whenever the layout below changes; older files are then rejected
+SNAPSHOT_VERSION = 1
+DEFAULT_SNAPSHOT = "data/knowledge_graph.kgsnap"
+
+# CompiledKG columns stored as raw blocks. "l" columns are widened to int64
+# ("q") so a snapshot reads the same on every platform.
+_ARRAYS = (
+    "type_codes", "edge_sources", "edge_targets", "edge_sign_codes", "edge_strengths", "edge_relations",
+    "out_offsets", "out_edges", "out_targets", "out_signs", "out_strengths", "out_relations",
+    "in_offsets", "in_edges", "in_sources", "in_signs", "in_strengths", "in_relations", "in_out_slots",
+)
+_ALIGN = 8
+
+# Layout: magic, <version, header length> as two little-endian uint32, the JSON
+# header (string tables, extras, and the offset/typecode/length of every
+# block), then the 8-byte aligned array blocks in native byte order.
+_PREFIX = struct.Struct("<II")
+
+
+def write_snapshot(kg, path=DEFAULT_SNAPSHOT):
+    """
+    Write the compiled form of kg to a versioned binary snapshot at path.
+    The snapshot holds the id, label, type and relation tables, the CSR and edge
+    columns, and the graph fingerprint (so QueryCache keys match the source
+    graph). The file is written to a temporary name and moved into place, so
+    readers never map a half-written file.
+    """
+    g = compile_kg(kg)
+    blocks = []
+    table = {}
+    offset = 0
+    for name in _ARRAYS:
+        column = getattr(g, name)
+        typecode = getattr(column, "typecode", None) or column.format
+        if typecode in ("l", "q"):
+            column, typecode = array("q", column), "q"
+        data = bytes(column)
+        table[name] = [offset, typecode, len(column)]
+        blocks.append(data)
+        offset += len(data)
+        padding = -offset % _ALIGN
+        blocks.append(b"\0" * padding)
+        offset += padding
+    header = json.dumps({
+        "byteorder": sys.byteorder,
+        "fingerprint": graph_fingerprint(g),
+        "node_count": g.node_count,
+        "edge_count": g.edge_count,
+        "ids": g.ids,
+        "labels": g.labels,
+        "type_names": g.type_names,
+        "relation_names": g.relation_names,
+        "node_extras": {str(k): v for k, v in g.node_extras.items()} if g.kg is None else _extras(g, "nodes"),
+        "edge_extras": {str(k): v for k, v in g.edge_extras.items()} if g.kg is None else _extras(g, "edges"),
+        "unsigned_edges": sorted(g.unsigned_edges),
+        "arrays": table,
+    }, ensure_ascii=False, default=str).encode("utf-8")
+    start = len(SNAPSHOT_MAGIC) + _PREFIX.size + len(header)
+    start += -start % _ALIGN
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(_PREFIX.pack(SNAPSHOT_VERSION, len(header)))
+        f.write(header)
+        f.write(b"\0" * (start - f.tell()))
+        for block in blocks:
+            f.write(block)
+    os.replace(tmp, path)
+    return path
+
+
+def _extras(g, key):
+    """Non-column fields of the source dicts, by position (what keep_source=False keeps)."""
+    columns = _NODE_COLUMNS if key == "nodes" else _EDGE_COLUMNS
+    extras = {}
+    for i, item in enumerate(g.kg[key]):
+        extra = {k: v for k, v in item.items() if k not in columns}
+        if extra:
+            extras[str(i)] = extra
+    return extras
+
+
+def load_snapshot(path=DEFAULT_SNAPSHOT):
+    """
+    Map a snapshot written by write_snapshot and return it as a CompiledKG.
+    The array columns are read-only memoryviews straight onto the mapped file,
+    so nothing is copied and processes that load the same snapshot share its
+    pages (numpy.asarray wraps them without copying too). Only the id, label and
+    name tables are decoded. The graph behaves like CompiledKG(kg,
+    keep_source=False); pickling it sends just the path, so pool workers re-map
+    the file instead of receiving a copy.
+    Raises ValueError for files that are not snapshots, or that come from
+    another SNAPSHOT_VERSION or byte order.
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a knowledge graph snapshot.")
+    version, header_len = _PREFIX.unpack_from(mapped, len(SNAPSHOT_MAGIC))
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"{path} is snapshot version {version}; expected {SNAPSHOT_VERSION}. Rebuild it with write_snapshot.")
+    header_start = len(SNAPSHOT_MAGIC) + _PREFIX.size
+    header = json.loads(mapped[header_start:header_start + header_len].decode("utf-8"))
+    if header["byteorder"] != sys.byteorder:
+        raise ValueError(f"{path} was written on a {header['byteorder']}-endian machine.")
+    start = header_start + header_len
+    start += -start % _ALIGN
+
+    g = CompiledKG.__new__(CompiledKG)
+    g.kg = None
+    g.fingerprint = header["fingerprint"]
+    g.derived = {"snapshot_path": os.path.abspath(path)}
+    g.ids = [sys.intern(node_id) for node_id in header["ids"]]
+    g.index = {node_id: i for i, node_id in enumerate(g.ids)}
+    g.node_count = header["node_count"]
+    g.edge_count = header["edge_count"]
+    g.labels = [sys.intern(label) for label in header["labels"]]
+    g.type_names = header["type_names"]
+    g.relation_names = header["relation_names"]
+    g.node_extras = {int(k): v for k, v in header["node_extras"].items()}
+    g.edge_extras = {int(k): v for k, v in header["edge_extras"].items()}
+    g.unsigned_edges = set(header.get("unsigned_edges", ()))
+    # edge_sign falls back to scanning the CSR arrays instead of a per-edge dict
+    g.edge_signs = None
+    view = memoryview(mapped)
+    for name, (offset, typecode, length) in header["arrays"].items():
+        size = struct.calcsize(typecode) * length
+        setattr(g, name, view[start + offset:start + offset + size].cast(typecode))
+    return g
+
+
+if __name__ == "__main__":
+    # Build step: snapshot sample_kg merged with every JSON section
+    from knowledge_graph_merge import load_unified_kg
+    out = write_snapshot(load_unified_kg())
+    print(f"Wrote {out} ({os.path.getsize(out)} bytes)")
@@ -10,6 +10,11 @@ from langchain_community.tools import TavilySearchResults
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 import json
 from dotenv import load_dotenv
+from knowledge_graph_sample import sample_kg
+from knowledge_graph_index import compile_kg
+from knowledge_graph_analysis import feedback_loops, format_loop
+from knowledge_graph_search import search_index
+from knowledge_graph_encoder import kg_to_text_scoped
 
 load_dotenv()
 
@@ -36,6 +41,27 @@ llm = ChatOpenAI(model="gpt-4-turbo-preview", temperature=0.1)
 # Initialize Tavily search tool
 tavily_search = TavilySearchResults(max_results=5)
 
+# Compiled once so the feedback loops found in it are reused across workflow runs
+scenario_kg = compile_kg(sample_kg)
+
+def kg_feedback_loops(max_length=6, limit=10):
+    """Reinforcing/balancing loops of the scenario knowledge graph, shortest first."""
+    return [
+        {
+            "loop": format_loop(loop),
+            "polarity": loop["polarity"],
+            "length": loop["length"],
+            "nodes": loop["nodes"],
+        }
+        for loop in feedback_loops(scenario_kg, max_length=max_length, limit=limit)
+    ]
+
+def kg_context(text, token_budget=600, paths=0):
+    """The part of the scenario knowledge graph around the nodes mentioned in text, for prompts."""
+    focus = search_index(scenario_kg).mentions(text, limit=5)
+    scoped = kg_to_text_scoped(scenario_kg, focus, hops=1, paths=paths, token_budget=token_budget)
+    return f"\n\nKnowledge graph:\n{scoped}" if scoped else ""
+
 # Context Finder Node
 def context_finder(state: WorkflowState) -> WorkflowState:
     """Finds relevant context and determines if scenario analysis is needed."""
@@ -193,7 +219,7 @@ Generate possible scenarios based on this information.""")
     response = chain.invoke({
         "messages": state["messages"],
         "user_query": state["user_query"],
-        "context": state["context"] + "\n\nAdditional context:\n" + scenario_context
+        "context": state["context"] + "\n\nAdditional context:\n" + scenario_context + kg_context(state["user_query"])
     })
     
     # Parse scenarios from response
@@ -308,13 +334,16 @@ Provide specific, differentiated analysis for each scenario. Focus on how each s
         print(f"Impact search error: {e}")
         impact_context = "No impact analysis context available"
     
+    # Ground the analysis in the KG nodes the query and scenarios mention
+    scenario_text = " ".join([state["user_query"]] + [scenario.get("name", "") for scenario in state["top_scenarios"]])
+
     # Generate impact analysis
     chain = prompt | llm
     response = chain.invoke({
         "messages": state["messages"],
         "top_scenarios": json.dumps(state["top_scenarios"], indent=2),
         "user_query": state["user_query"],
-        "context": state["context"] + "\n\nImpact Research:\n" + impact_context
+        "context": state["context"] + "\n\nImpact Research:\n" + impact_context + kg_context(scenario_text, paths=2)
     })
     
     # Parse the analysis and create detailed asset impacts
@@ -362,7 +391,7 @@ Provide specific, differentiated analysis for each scenario. Focus on how each s
         causal_relationships = {
             "direct_effects": "Immediate market reactions, policy implementation impacts, and first-order economic consequences that occur directly from scenario events.",
             "indirect_effects": "Secondary impacts including supply chain disruptions, consumer behavior changes, and cross-sector economic effects that cascade from primary impacts.",
-            "feedback_loops": "Reinforcing mechanisms that amplify initial effects (e.g., market panic) and balancing mechanisms that dampen impacts (e.g., adaptive responses)."
+            "feedback_loops": kg_feedback_loops()
         }
     except Exception as e:
         print(f"Asset impact parsing error: {e}")
@@ -393,7 +422,7 @@ Provide specific, differentiated analysis for each scenario. Focus on how each s
         causal_relationships = {
             "direct_effects": "Immediate market reactions and policy implementation impacts that occur directly from scenario events.",
             "indirect_effects": "Secondary impacts including supply chain disruptions and cross-sector economic effects.",
-            "feedback_loops": "Reinforcing and balancing mechanisms that amplify or dampen initial scenario impacts over time."
+            "feedback_loops": kg_feedback_loops()
         }
     return {
         **state,